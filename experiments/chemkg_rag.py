@@ -12,9 +12,12 @@ Excludes (v2): MMGraphRAG multimodal support
 """
 
 import json
+import threading
+import time
 import numpy as np
 from pathlib import Path
 from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from typing import Optional
 import urllib.request
 
@@ -31,19 +34,165 @@ GRAPH_FILE = DATA_DIR / "knowledge_graph.json"
 RESULTS_FILE = DATA_DIR / "full_extraction_results.json"
 ENHANCED_GRAPH_FILE = DATA_DIR / "chemkg_enhanced.json"
 
+# answer_question concurrency: worker threads, and in-flight calls per backend
+MAX_WORKERS = 8
+BACKEND_LIMITS = {"embed": 4, "qdrant": 8, "llm": 2}
+
+# relations that carry PageRank mass (later edges overwrite earlier ones)
+PAGERANK_RELATIONS = ("prerequisite_for", "leads_to")
+
+
+def build_rank_csr(sources: list, targets: list, weights: list, n: int):
+    """
+    compressed sparse row transition matrix for PageRank.
+
+    rank flows from an edge's target back to its source, so the nodes many
+    topics build on collect the most. row i lists the targets j feeding
+    node i, with weight w_ij / (sum of weights into j). a repeated (i, j)
+    pair keeps its last weight, as assigning into a dense matrix would.
+
+    returns (offsets, indices, weights, dangling): feeders of i are
+    indices[offsets[i]:offsets[i + 1]], dangling marks nodes with no
+    outgoing mass.
+    """
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.float64)
+
+    # dedupe on (source, target): unique keeps the first of the reversed
+    # arrays, i.e. the last write, and returns keys in row-major order
+    keys, last = np.unique((sources * n + targets)[::-1], return_index=True)
+    rows, cols = keys // n, keys % n
+    vals = weights[::-1][last]
+
+    out_mass = np.bincount(cols, weights=vals, minlength=n)
+    dangling = out_mass == 0
+    vals = vals / np.where(dangling, 1, out_mass)[cols]
+
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=offsets[1:])
+    return offsets, cols, vals, dangling
+
+
+def pagerank_csr(csr, damping: float = 0.85, max_iter: int = 100, tol: float = 1e-6,
+                 personalization=None) -> np.ndarray:
+    """
+    power iteration over a build_rank_csr matrix.
+
+    mass at dangling nodes is spread like the teleport distribution, so
+    scores always sum to 1. personalization (length n, non-negative) sets
+    the teleport distribution; uniform by default. an (n, k) array runs k
+    personalized rankings in one pass and returns (n, k) scores.
+    """
+    offsets, indices, weights, dangling = csr
+    n = len(offsets) - 1
+    if n == 0:
+        return np.zeros(0)
+
+    if personalization is None:
+        teleport = np.full(n, 1.0 / n)
+    else:
+        teleport = np.asarray(personalization, dtype=np.float64)
+        teleport = teleport / teleport.sum(axis=0)
+    if teleport.ndim == 2:
+        weights = weights[:, None]
+
+    # reduceat over non-empty rows only (it misreads empty ones)
+    starts = offsets[:-1]
+    filled = np.diff(offsets) > 0
+    starts = starts[filled]
+
+    pr = teleport.copy()
+    for _ in range(max_iter):
+        pulled = np.zeros_like(pr)
+        if len(indices):
+            pulled[filled] = np.add.reduceat(weights * pr[indices], starts)
+        pr_new = damping * (pulled + pr[dangling].sum(axis=0) * teleport) + (1 - damping) * teleport
+        done = np.abs(pr_new - pr).sum(axis=0).max() < tol
+        pr = pr_new
+        if done:
+            break
+    return pr
+
+
+def run_dag(tasks: list, run, pool) -> dict:
+    """
+    run tasks ({"id", "depends_on"}) on pool, each as soon as all of its
+    dependencies have finished; returns id -> result. run(task, results)
+    gets the results finished so far, which include its dependencies.
+    """
+    by_id = {t["id"]: t for t in tasks}
+    waiting = {t["id"]: set(t.get("depends_on", [])) for t in tasks}
+    results, running = {}, {}
+
+    while waiting or running:
+        for tid in [tid for tid, deps in waiting.items() if deps.issubset(results)]:
+            del waiting[tid]
+            running[pool.submit(run, by_id[tid], dict(results))] = tid
+        if not running:
+            raise ValueError(f"Unsatisfiable dependencies for tasks {sorted(waiting)}")
+
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            results[running.pop(future)] = future.result()
+
+    return results
+
 
 class ChemKGRAG:
     """
     hybrid knowledge graph RAG for inorganic chemistry
     """
 
-    def __init__(self):
+    def __init__(self, max_workers: int = MAX_WORKERS, backend_limits: Optional[dict] = None):
         self.qdrant = QdrantClient(url=QDRANT_URL)
+        # bounded concurrency: threads for answer_question, and a semaphore
+        # per backend (embed, qdrant, llm) capping its in-flight calls
+        self.max_workers = max_workers
+        limits = {**BACKEND_LIMITS, **(backend_limits or {})}
+        self.backends = {name: threading.BoundedSemaphore(n) for name, n in limits.items()}
         self.graph = None
         self.node_to_chunks = {}  # mutual indexing: node_id -> [chunk_ids]
         self.chunk_to_nodes = {}  # mutual indexing: chunk_id -> [node_ids]
-        self.prereq_matrix = None  # for PageRank
+        self.prereq_csr = None  # sparse transition matrix for PageRank
         self.node_index = {}  # node_id -> index for matrix ops
+        self.node_ids = []  # index -> node_id
+        self.graph_version = 0  # bumped whenever self.graph is replaced
+        self._prereq_version = None  # graph version prereq_csr was built from
+        self._pagerank_cache = {}  # (damping, max_iter, tol) -> scores
+        self._derived_cache = {}  # name -> (graph version, value)
+        self.node_by_id = {}  # node_id -> node (first one, as a scan finds it)
+        self.edges_from = {}  # relation -> source -> [edges], in file order
+
+    def set_graph(self, graph: dict):
+        """
+        replace the graph; derived structures rebuild on next use
+        (call with self.graph after editing nodes or edges in place)
+        """
+        self.graph = graph
+        self.graph_version += 1
+
+        # id and adjacency lookups for retrieval, built once per load
+        self.node_by_id = {}
+        for node in graph["nodes"]:
+            self.node_by_id.setdefault(node["id"], node)
+        self.edges_from = {}
+        for e in graph["edges"]:
+            self.edges_from.setdefault(e["relation"], {}).setdefault(e["source"], []).append(e)
+
+    def _derived(self, name: str, build):
+        """structure derived from the graph, built once per graph version"""
+        version, value = self._derived_cache.get(name, (None, None))
+        if version != self.graph_version:
+            value = build()
+            self._derived_cache[name] = (self.graph_version, value)
+        return value
+
+    def _load_graph(self):
+        """load the base knowledge graph if none is loaded yet"""
+        if self.graph is None:
+            with open(GRAPH_FILE) as f:
+                self.set_graph(json.load(f))
 
     # =========================================================================
     # COMPONENT 1: KAG - Mutual Indexing
@@ -62,7 +211,7 @@ class ChemKGRAG:
 
         # load current graph
         with open(GRAPH_FILE) as f:
-            self.graph = json.load(f)
+            self.set_graph(json.load(f))
 
         # build node lookup
         node_ids = {n["id"] for n in self.graph["nodes"]}
@@ -122,11 +271,12 @@ class ChemKGRAG:
             return []
 
         # qdrant retrieve by IDs
-        points = self.qdrant.retrieve(
-            collection_name=COLLECTION,
-            ids=chunk_ids[:limit],
-            with_payload=True
-        )
+        with self.backends["qdrant"]:
+            points = self.qdrant.retrieve(
+                collection_name=COLLECTION,
+                ids=chunk_ids[:limit],
+                with_payload=True
+            )
 
         return [{
             "id": p.id,
@@ -141,94 +291,105 @@ class ChemKGRAG:
 
     def build_prereq_graph(self):
         """
-        build adjacency matrix for prerequisite relationships
+        build sparse transition matrix for prerequisite relationships
         enables PageRank-based importance scoring
         """
         print("Building prerequisite graph (HippoRAG)...")
 
-        if self.graph is None:
-            with open(GRAPH_FILE) as f:
-                self.graph = json.load(f)
+        self._load_graph()
 
         # get all topic nodes
         topics = [n for n in self.graph["nodes"] if n["type"] == "topic"]
         self.node_index = {n["id"]: i for i, n in enumerate(topics)}
+        self.node_ids = [n["id"] for n in topics]
         n = len(topics)
 
         print(f"  Topic nodes: {n}")
 
-        # build adjacency matrix (prerequisite_for edges)
         # if A is prerequisite_for B, then A -> B in the graph
-        adj = np.zeros((n, n))
-
-        prereq_edges = [e for e in self.graph["edges"] if e["relation"] == "prerequisite_for"]
-        leads_to_edges = [e for e in self.graph["edges"] if e["relation"] == "leads_to"]
-
-        for e in prereq_edges:
-            src, tgt = e["source"], e["target"]
-            if src in self.node_index and tgt in self.node_index:
-                i, j = self.node_index[src], self.node_index[tgt]
-                adj[i, j] = e.get("weight", 1)
-
-        for e in leads_to_edges:
-            src, tgt = e["source"], e["target"]
-            if src in self.node_index and tgt in self.node_index:
-                i, j = self.node_index[src], self.node_index[tgt]
-                adj[i, j] = e.get("weight", 1)
-
-        print(f"  Prerequisite edges: {len(prereq_edges)}")
-        print(f"  Leads-to edges: {len(leads_to_edges)}")
-
-        self.prereq_matrix = adj
+        sources, targets, weights = [], [], []
+        counts = {r: 0 for r in PAGERANK_RELATIONS}
+        for relation in PAGERANK_RELATIONS:
+            for e in self.graph["edges"]:
+                if e["relation"] != relation:
+                    continue
+                counts[relation] += 1
+                src, tgt = e["source"], e["target"]
+                if src in self.node_index and tgt in self.node_index:
+                    sources.append(self.node_index[src])
+                    targets.append(self.node_index[tgt])
+                    weights.append(e.get("weight", 1))
+
+        print(f"  Prerequisite edges: {counts['prerequisite_for']}")
+        print(f"  Leads-to edges: {counts['leads_to']}")
+
+        self.prereq_csr = build_rank_csr(sources, targets, weights, n)
+        self._prereq_version = self.graph_version
+        self._pagerank_cache = {}
         return self
 
     def pagerank(self, damping: float = 0.85, max_iter: int = 100, tol: float = 1e-6) -> dict:
         """
         compute PageRank scores for topic nodes
         higher score = more fundamental/central concept
+        cached until the graph is replaced or the matrix rebuilt
         """
-        if self.prereq_matrix is None:
-            self.build_prereq_graph()
-
-        n = self.prereq_matrix.shape[0]
-        if n == 0:
-            return {}
+        return dict(self._pagerank_scores(damping, max_iter, tol))
 
-        # normalize adjacency matrix (column-stochastic)
-        col_sums = self.prereq_matrix.sum(axis=0)
-        col_sums[col_sums == 0] = 1  # avoid division by zero
-        M = self.prereq_matrix / col_sums
+    def _pagerank_scores(self, damping: float = 0.85, max_iter: int = 100, tol: float = 1e-6) -> dict:
+        """cached PageRank dict; shared, so callers must not modify it"""
+        if self.prereq_csr is None or self._prereq_version != self.graph_version:
+            self.build_prereq_graph()
 
-        # initialize PageRank vector
-        pr = np.ones(n) / n
+        key = (damping, max_iter, tol)
+        if key not in self._pagerank_cache:
+            pr = pagerank_csr(self.prereq_csr, damping, max_iter, tol)
+            self._pagerank_cache[key] = dict(zip(self.node_ids, pr.tolist()))
+        return self._pagerank_cache[key]
 
-        # power iteration
-        for _ in range(max_iter):
-            pr_new = (1 - damping) / n + damping * M @ pr
-            if np.abs(pr_new - pr).sum() < tol:
-                break
-            pr = pr_new
-
-        # map back to node IDs
-        index_to_node = {i: nid for nid, i in self.node_index.items()}
-        scores = {index_to_node[i]: float(pr[i]) for i in range(n)}
+    def _personalized_scores(self, seed_sets: list, damping: float = 0.85) -> np.ndarray:
+        """(n, k) personalized PageRank, one column per {topic: weight} seed set"""
+        if self.prereq_csr is None or self._prereq_version != self.graph_version:
+            self.build_prereq_graph()
 
-        return scores
+        teleport = np.zeros((len(self.node_ids), len(seed_sets)))
+        for k, seeds in enumerate(seed_sets):
+            for t, w in seeds.items():
+                if t in self.node_index and w > 0:
+                    teleport[self.node_index[t], k] += w
+            if not teleport[:, k].any():
+                teleport[:, k] = 1  # no known seed: fall back to global ranking
+        return pagerank_csr(self.prereq_csr, damping, personalization=teleport)
 
-    def get_prerequisites_ranked(self, topic: str, depth: int = 2) -> list:
+    def personalized_pagerank(self, seeds, damping: float = 0.85):
         """
-        get prerequisites for a topic, ranked by PageRank importance
-        uses BFS up to specified depth, then ranks by centrality
+        PageRank with teleports restricted to seed topics ({topic: weight})
+        a list of seed dicts is ranked in one pass and returns a list
         """
-        if self.graph is None:
-            with open(GRAPH_FILE) as f:
-                self.graph = json.load(f)
+        batch = isinstance(seeds, list)
+        seed_sets = seeds if batch else [seeds]
+        scores = self._personalized_scores(seed_sets, damping) if seed_sets else None
+
+        if scores is None or not self.node_ids:
+            results = [{} for _ in seed_sets]
+        else:
+            results = [dict(zip(self.node_ids, scores[:, k].tolist())) for k in range(len(seed_sets))]
+        return results if batch else results[0]
 
-        # build reverse edge lookup (what are prerequisites FOR this topic)
+    def _build_prereq_of(self) -> dict:
+        """reverse edge lookup: topic -> [(prerequisite, weight)]"""
         prereq_of = defaultdict(list)
         for e in self.graph["edges"]:
             if e["relation"] == "prerequisite_for":
                 prereq_of[e["target"]].append((e["source"], e.get("weight", 1)))
+        return dict(prereq_of)
+
+    def _collect_prerequisites(self, topic: str, depth: int) -> list:
+        """BFS over prerequisite_for edges up to depth"""
+        self._load_graph()
+
+        # what are prerequisites FOR this topic (built once per graph version)
+        prereq_of = self._derived("prereq_of", self._build_prereq_of)
 
         # BFS to find all prerequisites up to depth
         visited = set()
@@ -245,16 +406,45 @@ class ChemKGRAG:
                         all_prereqs.append({"topic": prereq, "depth": d + 1, "weight": weight})
             current = next_level
 
-        # get PageRank scores
-        pr_scores = self.pagerank()
+        return all_prereqs
 
-        # rank by PageRank (higher = more fundamental)
-        for p in all_prereqs:
-            p["pagerank"] = pr_scores.get(p["topic"], 0)
+    def get_prerequisites_ranked(self, topic: str, depth: int = 2, seeds: Optional[dict] = None) -> list:
+        """
+        get prerequisites for a topic, ranked by PageRank importance
+        uses BFS up to specified depth, then ranks by centrality
 
-        all_prereqs.sort(key=lambda x: -x["pagerank"])
+        with seeds ({topic: weight}, e.g. retrieval scores) ranks by
+        personalized PageRank instead, stored as "ppr"
+        """
+        return self.get_prerequisites_ranked_batch([(topic, seeds)], depth)[0]
 
-        return all_prereqs
+    def get_prerequisites_ranked_batch(self, queries: list, depth: int = 2) -> list:
+        """
+        get_prerequisites_ranked for several (topic, seeds) pairs
+        all personalized rankings share one power iteration
+        """
+        results = [self._collect_prerequisites(topic, depth) for topic, _ in queries]
+
+        # get PageRank scores (cached per graph version)
+        pr_scores = self._pagerank_scores()
+
+        # rank by PageRank (higher = more fundamental)
+        for prereqs in results:
+            for p in prereqs:
+                p["pagerank"] = pr_scores.get(p["topic"], 0)
+            prereqs.sort(key=lambda x: -x["pagerank"])
+
+        # query-aware ranking for those with seeds
+        personalized = [k for k, (_, seeds) in enumerate(queries) if seeds]
+        if personalized and self.node_ids:
+            scores = self._personalized_scores([queries[k][1] for k in personalized])
+            for col, k in enumerate(personalized):
+                for p in results[k]:
+                    i = self.node_index.get(p["topic"])
+                    p["ppr"] = float(scores[i, col]) if i is not None else 0.0
+                results[k].sort(key=lambda x: -x["ppr"])
+
+        return results
 
     # =========================================================================
     # COMPONENT 3: LAG - Sub-question Decomposition
@@ -340,7 +530,7 @@ Return JSON:
         try:
             embed_req = urllib.request.Request(embed_url, data=embed_data,
                                                headers={'Content-Type': 'application/json'})
-            with urllib.request.urlopen(embed_req, timeout=30) as resp:
+            with self.backends["embed"], urllib.request.urlopen(embed_req, timeout=30) as resp:
                 embed_result = json.loads(resp.read().decode('utf-8'))
                 query_vector = embed_result['embeddings'][0]
         except Exception as e:
@@ -348,13 +538,14 @@ Return JSON:
             return {"topics": [], "concepts": [], "query": query}
 
         # search Qdrant with the embedding (using named vector 'dense')
-        response = self.qdrant.query_points(
-            collection_name=COLLECTION,
-            query=query_vector,
-            using="dense",  # named vector in this collection
-            limit=top_k * 2,  # get more, then filter
-            with_payload=True
-        )
+        with self.backends["qdrant"]:
+            response = self.qdrant.query_points(
+                collection_name=COLLECTION,
+                query=query_vector,
+                using="dense",  # named vector in this collection
+                limit=top_k * 2,  # get more, then filter
+                with_payload=True
+            )
         topic_results = response.points
 
         # extract topics from search results
@@ -364,7 +555,7 @@ Return JSON:
             nodes = self.get_nodes_for_chunk(chunk_id)
             for node in nodes:
                 # check if it's a topic node
-                node_data = next((n for n in self.graph["nodes"] if n["id"] == node), None)
+                node_data = self.node_by_id.get(node)
                 if node_data and node_data.get("type") == "topic":
                     topic_hits[node]["score"] = max(topic_hits[node]["score"], hit.score)
                     topic_hits[node]["chunks"].append(chunk_id)
@@ -375,13 +566,12 @@ Return JSON:
         concept_hits = []
         for topic, data in top_topics:
             # find concepts associated with this topic
-            for edge in self.graph["edges"]:
-                if edge["source"] == topic and edge["relation"] == "contains":
-                    concept_hits.append({
-                        "concept": edge["target"],
-                        "topic": topic,
-                        "weight": edge.get("weight", 1)
-                    })
+            for edge in self.edges_from.get("contains", {}).get(topic, []):
+                concept_hits.append({
+                    "concept": edge["target"],
+                    "topic": topic,
+                    "weight": edge.get("weight", 1)
+                })
 
         return {
             "topics": [{"topic": t, **d} for t, d in top_topics],
@@ -393,17 +583,33 @@ Return JSON:
     # UNIFIED QUERY INTERFACE
     # =========================================================================
 
-    def answer_question(self, question: str, verbose: bool = True) -> dict:
+    def _retrieve_for(self, sq: dict) -> dict:
+        """retrieval for one sub-question: LightRAG levels plus KAG source chunks"""
+        # dual-level retrieval (LightRAG)
+        retrieval = self.dual_level_retrieve(sq["question"])
+
+        # retrieve source chunks (KAG mutual indexing)
+        chunk_ids = []
+        for t in retrieval["topics"][:3]:
+            chunk_ids.extend(t.get("chunks", []))
+        retrieval["chunks"] = self.retrieve_chunks(list(set(chunk_ids)), limit=5)
+        return retrieval
+
+    def answer_question(self, question: str, verbose: bool = True, personalized: bool = True) -> dict:
         """
         full ChemKG-RAG pipeline:
         1. LAG: decompose question
         2. LAG: build dependency DAG
-        3. for each sub-question:
+        3. for all sub-questions at once:
            - LightRAG: dual-level retrieval
-           - HippoRAG: get ranked prerequisites
            - KAG: retrieve source chunks
-           - generate answer
-        4. synthesize final answer
+        4. HippoRAG: get ranked prerequisites (personalized PageRank
+           seeded by the retrieved topics, unless personalized=False)
+        5. generate answers, each as soon as the answers it depends on
+           are in, so independent sub-questions run concurrently
+        6. synthesize final answer
+
+        concurrency is bounded by max_workers and the per-backend limits
         """
         if verbose:
             print(f"\n{'='*60}")
@@ -421,59 +627,62 @@ Return JSON:
             for sq in ordered_sqs:
                 print(f"    {sq['id']}. {sq['question'][:50]}...")
 
-        # step 2-3: answer each sub-question
-        answers = {}
-        all_context = []
-
-        for sq in ordered_sqs:
-            sq_id = sq["id"]
-            sq_text = sq["question"]
-
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            # step 2: retrieve for every sub-question (doesn't need earlier answers)
             if verbose:
-                print(f"\n[2/4] Processing sub-question {sq_id}...")
-
-            # dual-level retrieval (LightRAG)
-            retrieval = self.dual_level_retrieve(sq_text)
+                print(f"\n[2/4] Retrieving for {len(ordered_sqs)} sub-questions...")
+            retrievals = dict(zip([sq["id"] for sq in ordered_sqs], pool.map(self._retrieve_for, ordered_sqs)))
+
+            # get prerequisites for each top topic (HippoRAG), all ranked in one
+            # batch; personalized runs seed PageRank with the retrieval scores
+            ranked = [sq["id"] for sq in ordered_sqs if retrievals[sq["id"]]["topics"]]
+            queries = []
+            for sq_id in ranked:
+                topics = retrievals[sq_id]["topics"]
+                seeds = {t["topic"]: t["score"] for t in topics} if personalized else None
+                queries.append((topics[0]["topic"], seeds))
+            prereqs_by_sq = dict(zip(ranked, self.get_prerequisites_ranked_batch(queries, depth=2)))
 
             if verbose:
-                print(f"  Topics found: {len(retrieval['topics'])}")
-                print(f"  Concepts found: {len(retrieval['concepts'])}")
-
-            # get prerequisites for top topic (HippoRAG)
-            prereqs = []
-            if retrieval["topics"]:
-                top_topic = retrieval["topics"][0]["topic"]
-                prereqs = self.get_prerequisites_ranked(top_topic, depth=2)[:5]
+                for sq in ordered_sqs:
+                    retrieval = retrievals[sq["id"]]
+                    prereqs = prereqs_by_sq.get(sq["id"], [])
+                    print(f"  {sq['id']}. topics: {len(retrieval['topics'])}, "
+                          f"concepts: {len(retrieval['concepts'])}, chunks: {len(retrieval['chunks'])}, "
+                          f"prerequisites: {[p['topic'] for p in prereqs[:3]]}")
+
+            # step 3: answer each sub-question once its dependencies are answered
+            if verbose:
+                print("\n[3/4] Answering sub-questions...")
+
+            def answer_one(sq, answers):
+                retrieval = retrievals[sq["id"]]
+                prereqs = prereqs_by_sq.get(sq["id"], [])[:5]
+
+                # build context
+                context = {
+                    "sub_question": sq["question"],
+                    "topics": [t["topic"] for t in retrieval["topics"]],
+                    "concepts": [c["concept"] for c in retrieval["concepts"][:5]],
+                    "prerequisites": [p["topic"] for p in prereqs],
+                    "chunks": [c["text"][:500] for c in retrieval["chunks"]],
+                    "previous_answers": {k: answers[k][0][:200] for k in sq.get("depends_on", []) if k in answers}
+                }
 
+                # generate answer for sub-question
+                answer = self._generate_answer(sq["question"], context)
                 if verbose:
-                    print(f"  Prerequisites: {[p['topic'] for p in prereqs[:3]]}")
+                    print(f"  {sq['id']}. ({time.perf_counter() - started:.1f}s) {answer[:100]}...")
+                return answer, context
 
-            # retrieve source chunks (KAG mutual indexing)
-            chunk_ids = []
-            for t in retrieval["topics"][:3]:
-                chunk_ids.extend(t.get("chunks", []))
-            chunks = self.retrieve_chunks(list(set(chunk_ids)), limit=5)
+            results = run_dag(ordered_sqs, answer_one, pool)
 
-            if verbose:
-                print(f"  Source chunks: {len(chunks)}")
-
-            # build context
-            context = {
-                "sub_question": sq_text,
-                "topics": [t["topic"] for t in retrieval["topics"]],
-                "concepts": [c["concept"] for c in retrieval["concepts"][:5]],
-                "prerequisites": [p["topic"] for p in prereqs],
-                "chunks": [c["text"][:500] for c in chunks],
-                "previous_answers": {k: answers[k][:200] for k in sq.get("depends_on", []) if k in answers}
-            }
-            all_context.append(context)
-
-            # generate answer for sub-question
-            answer = self._generate_answer(sq_text, context)
-            answers[sq_id] = answer
+        answers = {sq["id"]: results[sq["id"]][0] for sq in ordered_sqs}
+        all_context = [results[sq["id"]][1] for sq in ordered_sqs]
 
-            if verbose:
-                print(f"  Answer: {answer[:100]}...")
+        if verbose:
+            print(f"  Answered {len(answers)} sub-questions in {time.perf_counter() - started:.1f}s")
 
         # step 4: synthesize final answer
         if verbose:
@@ -514,7 +723,7 @@ Return JSON:
 
         req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
         try:
-            with urllib.request.urlopen(req, timeout=120) as response:
+            with self.backends["llm"], urllib.request.urlopen(req, timeout=120) as response:
                 result = json.loads(response.read().decode('utf-8'))
                 return json.loads(result['response'])
         except Exception as e:
@@ -554,7 +763,7 @@ Do NOT include any <think> tags or reasoning process - just the answer.
 
         req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
         try:
-            with urllib.request.urlopen(req, timeout=120) as response:
+            with self.backends["llm"], urllib.request.urlopen(req, timeout=120) as response:
                 result = json.loads(response.read().decode('utf-8'))
                 return result.get('response', 'Error generating answer')
         except Exception as e:
@@ -591,7 +800,7 @@ Do NOT include any <think> tags or reasoning process - just the answer.
 
         req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
         try:
-            with urllib.request.urlopen(req, timeout=120) as response:
+            with self.backends["llm"], urllib.request.urlopen(req, timeout=120) as response:
                 result = json.loads(response.read().decode('utf-8'))
                 return result.get('response', answers_text)
         except Exception as e:
@@ -608,9 +817,7 @@ Do NOT include any <think> tags or reasoning process - just the answer.
         """
         print("Detecting topic communities (GraphRAG)...")
 
-        if self.graph is None:
-            with open(GRAPH_FILE) as f:
-                self.graph = json.load(f)
+        self._load_graph()
 
         # build adjacency for topics only
         topics = {n["id"]: n for n in self.graph["nodes"] if n["type"] == "topic"}
@@ -750,7 +957,7 @@ Do NOT include any <think> tags.
 
         req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
         try:
-            with urllib.request.urlopen(req, timeout=120) as response:
+            with self.backends["llm"], urllib.request.urlopen(req, timeout=120) as response:
                 result = json.loads(response.read().decode('utf-8'))
                 return result.get('response', 'Error synthesizing')
         except Exception as e:
@@ -785,7 +992,7 @@ Do NOT include any <think> tags.
         """load enhanced graph if available, otherwise build it"""
         if ENHANCED_GRAPH_FILE.exists():
             with open(ENHANCED_GRAPH_FILE) as f:
-                self.graph = json.load(f)
+                self.set_graph(json.load(f))
 
             # rebuild in-memory indices
             self.node_to_chunks = defaultdict(list)
@@ -815,13 +1022,28 @@ def main():
     parser.add_argument("--build", action="store_true", help="Build/rebuild enhanced graph")
     parser.add_argument("--query", type=str, help="Query the system")
     parser.add_argument("--prereqs", type=str, help="Get prerequisites for a topic")
+    parser.add_argument("--personalized", action="store_true",
+                        help="Rank --prereqs by PageRank personalized to the topic")
     parser.add_argument("--stats", action="store_true", help="Show graph statistics")
     parser.add_argument("--communities", action="store_true", help="Detect topic communities")
     parser.add_argument("--coverage", type=str, help="Get cross-book coverage for a topic")
     parser.add_argument("--synthesize", type=str, help="Synthesize perspectives on a topic")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS,
+                        help=f"Threads for answering sub-questions (default {MAX_WORKERS})")
+    parser.add_argument("--limit", action="append", default=[], metavar="BACKEND=N",
+                        help=f"Max in-flight calls to a backend, repeatable (default "
+                             f"{', '.join(f'{k}={v}' for k, v in BACKEND_LIMITS.items())})")
     args = parser.parse_args()
 
-    rag = ChemKGRAG()
+    limits = {}
+    for item in args.limit:
+        name, _, value = item.partition("=")
+        if name not in BACKEND_LIMITS or not value.isdigit() or int(value) < 1:
+            parser.error(f"--limit expects BACKEND=N with BACKEND in {', '.join(BACKEND_LIMITS)} "
+                         f"and N >= 1, got {item!r}")
+        limits[name] = int(value)
+
+    rag = ChemKGRAG(max_workers=args.workers, backend_limits=limits)
 
     if args.build:
         print("Building ChemKG-RAG enhanced graph...")
@@ -838,12 +1060,13 @@ def main():
 
     elif args.prereqs:
         rag.load_enhanced_graph()
-        rag.build_prereq_graph()
-        prereqs = rag.get_prerequisites_ranked(args.prereqs)
+        seeds = {args.prereqs: 1.0} if args.personalized else None
+        prereqs = rag.get_prerequisites_ranked(args.prereqs, seeds=seeds)
         print(f"\nPrerequisites for '{args.prereqs}':")
         print("-" * 40)
         for p in prereqs[:10]:
-            print(f"  {p['topic']:40} (PageRank: {p['pagerank']:.4f}, depth: {p['depth']})")
+            ppr = f", personalized: {p['ppr']:.4f}" if "ppr" in p else ""
+            print(f"  {p['topic']:40} (PageRank: {p['pagerank']:.4f}{ppr}, depth: {p['depth']})")
 
     elif args.stats:
         rag.load_enhanced_graph()
@@ -854,8 +1077,7 @@ def main():
         print(f"  Nodes with chunks: {sum(1 for n in rag.graph['nodes'] if n.get('chunk_ids'))}")
         print(f"  Avg chunks/node: {np.mean([len(n.get('chunk_ids', [])) for n in rag.graph['nodes']]):.1f}")
 
-        # top PageRank topics
-        rag.build_prereq_graph()
+        # top PageRank topics (matrix is built on first use)
         pr = rag.pagerank()
         top_pr = sorted(pr.items(), key=lambda x: -x[1])[:10]
         print("\nTop 10 topics by PageRank (most fundamental):")
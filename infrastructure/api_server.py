@@ -4,49 +4,554 @@ Simple API server for the Knowledge Funnel visualization.
 
 endpoints:
   GET /api/trace?q=<question>  - trace prerequisites for a question
-  GET /api/concepts            - list all concepts
+                                 (optional &max_depth=N, default 5;
+                                  &paths=1 adds the BFS path to each node;
+                                  &stream=1 sends it chunked, layers before edges;
+                                  &budget=N keeps the N best nodes by &policy=
+                                  pagerank|weight|depth)
+  GET /api/enables?q=<question> - forward trace: what the concept unlocks
+                                 (same options as /api/trace)
+  GET /api/neighborhood?q=<question> - prerequisites and dependents in one pass
+                                 (optional &back=N, &forward=N, default 2; &paths=1)
+  GET /api/concepts            - list topics, most mentioned first (optional &offset,
+                                 &limit, &scale, &min_count, &prefix, &sort=count|pagerank)
+  GET /api/search?q=<text>     - ranked fuzzy concept lookup (optional &k=N)
+  GET /api/metrics             - Prometheus metrics (requests, latency, cache, traces)
+  POST /api/trace/batch        - trace many questions/concepts in one call
+                                 (body: {"questions": [...], "concepts": [...],
+                                  "max_depth": 5, "budget": N, "policy": ...,
+                                  "direction": "prereqs"|"enables"};
+                                  ?format=ndjson streams lines)
+  POST /api/plan               - ordered learning plan for a set of targets
+                                 (body: {"targets": [...], "known": [...]} or
+                                  {"targets": [...], "students": {name: [known...]}})
+  POST /api/admin/reload       - rebuild the graph from --graph in the background
+                                 (localhost only, or X-Admin-Token with --admin-token)
   GET /                        - serve the funnel.html visualization
 
+JSON responses are gzip/brotli-compressed when the client accepts it and
+carry an ETag; GET requests with a matching If-None-Match get a 304.
+static files are served the same way from precompressed .gz/.br
+variants written by --precompress.
+
 usage:
-  python api_server.py [--port 8361]
+  python api_server.py [--port 8361] [--workers 8] [--watch 5]
+  python api_server.py --precompress    # write .gz/.br next to static assets, then serve
 """
 
+import gzip
+import hashlib
+import hmac
 import json
+import signal
+import socket
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from http.server import HTTPServer, SimpleHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 from pathlib import Path
 import os
 
+try:
+    import brotli
+    HAS_BROTLI = True
+except ImportError:
+    HAS_BROTLI = False
+
 # import the path tracer
-from path_tracer import PathTracer
+from path_tracer import CONCEPT_SORTS, SCALE_ORDER, TRACE_DIRECTIONS, TRACE_POLICIES, PathTracer
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, NODE_BUCKETS, SIZE_BUCKETS, Registry
 
-# global tracer instance
+# global tracer instance; replaced wholesale on reload, so each request
+# takes one reference up front (handler.tracer) and uses only that
 tracer = None
 
 
+class TraceCache:
+    """
+    bounded LRU cache of serialized /api/trace response bytes.
+
+    keyed on (resolved concept, max_depth, ...) so different phrasings of the
+    same question share one entry. safe to use from multiple workers.
+
+    entries belong to one tracer (the owner): puts computed by any other
+    tracer are dropped, so a request still running on a replaced graph
+    can't repopulate the cache with stale traces.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.owner = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """return cached bytes (marking them most recently used) or None"""
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body: bytes, owner=None):
+        """store bytes, evicting the least recently used entry when full"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if owner is not self.owner:
+                return
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self, owner=None):
+        """drop every entry and accept new ones only from owner (the reloaded tracer)"""
+        with self._lock:
+            self._entries.clear()
+            self.owner = owner
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0
+            }
+
+
+# global trace response cache
+trace_cache = TraceCache()
+
+
+# routes reported individually in metrics; everything else is folded
+# into '/api/other' or 'static' so label cardinality stays bounded
+API_ROUTES = {'/api/trace', '/api/enables', '/api/neighborhood', '/api/concepts', '/api/search', '/api/health', '/api/metrics',
+              '/api/trace/batch', '/api/plan', '/api/admin/reload'}
+
+metrics = Registry()
+requests_total = metrics.counter('funnel_requests_total', 'HTTP requests by route, method and status',
+                                 ['route', 'method', 'status'])
+request_seconds = metrics.histogram('funnel_request_duration_seconds', 'Request handling time by route',
+                                    ['route'])
+response_bytes = metrics.histogram('funnel_response_bytes', 'Bytes written per response by route',
+                                   ['route'], buckets=SIZE_BUCKETS)
+trace_seconds = metrics.histogram('funnel_trace_compute_seconds',
+                                  'Closure, layering and serialization time per uncached trace')
+trace_nodes = metrics.histogram('funnel_trace_nodes', 'Closure nodes visited per uncached trace',
+                                buckets=NODE_BUCKETS)
+concept_traces = metrics.counter('funnel_concept_traces_total', 'Traces served per resolved concept',
+                                 ['concept'])
+metrics.gauge('funnel_trace_cache_lookups_total', 'Trace cache lookups by result',
+              lambda: [(('hit',), trace_cache.hits), (('miss',), trace_cache.misses)],
+              ['result'], kind='counter')
+metrics.gauge('funnel_trace_cache_hit_ratio', 'Trace cache hits / lookups',
+              lambda: trace_cache.stats()['hit_ratio'])
+metrics.gauge('funnel_trace_cache_entries', 'Cached trace responses', lambda: trace_cache.stats()['size'])
+metrics.gauge('funnel_graph_nodes', 'Concepts in the loaded graph', lambda: len(tracer.nodes) if tracer else 0)
+metrics.gauge('funnel_graph_generation', 'Graph loads since start (reloads + 1)',
+              lambda: reloader.generation if reloader else 0)
+
+
+def trace_budget(budget, policy):
+    """
+    validate optional budget/policy request values.
+    returns (budget or None, policy, error message or None)
+    """
+    policy = policy or 'pagerank'
+    if not isinstance(policy, str) or policy not in TRACE_POLICIES:
+        return None, 'pagerank', f"policy must be one of {', '.join(TRACE_POLICIES)}"
+    if budget in (None, ''):
+        return None, policy, None
+    try:
+        budget = int(budget)
+    except (TypeError, ValueError, OverflowError):
+        return None, policy, 'budget must be an integer'
+    if budget < 1:
+        return None, policy, 'budget must be at least 1'
+    return budget, policy, None
+
+
+def is_str_list(value) -> bool:
+    """True for a JSON list whose items are all strings"""
+    return isinstance(value, list) and all(isinstance(v, str) for v in value)
+
+
+def route_of(path: str) -> str:
+    """metrics label for a request path"""
+    path = urlparse(path).path
+    if path in API_ROUTES:
+        return path
+    return '/api/other' if path.startswith('/api/') else 'static'
+
+
+class CountingWriter:
+    """wraps a handler's wfile and counts the bytes written through it"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes = 0
+
+    def write(self, data):
+        self.bytes += len(data)
+        return self.raw.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+# responses smaller than this aren't worth compressing
+COMPRESS_MIN_BYTES = 1024
+# content codings we produce, in preference order, with their static file suffix
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')] if HAS_BROTLI else [('gzip', '.gz')]
+# static types worth precompressing (images and PDFs are compressed already)
+PRECOMPRESS_EXTENSIONS = {'.html', '.js', '.css', '.json', '.svg', '.txt', '.md'}
+
+# streamed responses are written in chunks of about this many bytes
+STREAM_CHUNK_BYTES = 16 * 1024
+
+class EncodedCache:
+    """
+    small LRU of compressed response bodies keyed on (content digest,
+    coding), bounded by their total size. only trace bodies (the ones
+    trace_cache keeps) go in, so a cached trace is compressed once rather
+    than on every request. safe to use from multiple workers.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+# compressed trace bodies
+encoded_cache = EncodedCache(max_bytes=8 * 1024 * 1024)
+
+
+def compress(body: bytes, encoding: str, level: int = 6) -> bytes:
+    """encode body with 'gzip' or 'br' (level is the gzip level; brotli scales it)"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=min(11, level))
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def accepted_encodings(header: str) -> list:
+    """(coding, suffix) pairs from ENCODINGS the client accepts, best first"""
+    accepted = {}
+    for part in (header or '').split(','):
+        name, _, params = part.partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    star = accepted.get('*', 0.0)
+    return [(enc, suffix) for enc, suffix in ENCODINGS if accepted.get(enc, star) > 0]
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match check; any content-coding variant of etag matches"""
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    base = etag.strip('"').split('+')[0]
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag.strip('"').split('+')[0] == base:
+            return True
+    return False
+
+
+def with_coding(etag: str, encoding: str) -> str:
+    """variant ETag for an encoded representation: "tag" -> "tag+gzip" """
+    return f'{etag[:-1]}+{encoding}"' if encoding else etag
+
+
+def precompress_static(root) -> tuple:
+    """
+    write .gz (and .br with brotli installed) next to each compressible
+    static file at maximum compression, skipping variants already newer
+    than their source. returns (files written, bytes saved).
+    """
+    written = saved = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith('.') and d != '__pycache__']
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            if os.path.splitext(name)[1].lower() not in PRECOMPRESS_EXTENSIONS:
+                continue
+            st = os.stat(path)
+            if st.st_size < COMPRESS_MIN_BYTES:
+                continue
+            data = None
+            for encoding, suffix in ENCODINGS:
+                variant = path + suffix
+                if os.path.exists(variant) and os.stat(variant).st_mtime_ns >= st.st_mtime_ns:
+                    continue
+                if data is None:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                encoded = compress(data, encoding, 9 if encoding == 'gzip' else 11)
+                with open(variant, 'wb') as f:
+                    f.write(encoded)
+                written += 1
+                saved += len(data) - len(encoded)
+    return written, saved
+
+
+# most items accepted in one /api/trace/batch request
+MAX_BATCH = 500
+# most students accepted in one /api/plan request
+MAX_ROSTER = 1000
+# largest /api/concepts page
+MAX_CONCEPTS_PAGE = 1000
+
+
+def trace_body(tracer: PathTracer, concept: str, max_depth: int, include_paths: bool = False,
+               budget: int = None, policy: str = 'pagerank', direction: str = 'prereqs') -> bytes:
+    """serialized trace for a resolved concept, served from the LRU cache when possible"""
+    key = (direction, concept, max_depth, include_paths, budget, policy if budget is not None else None)
+    trace = tracer.trace_enables if direction == 'enables' else tracer.trace_prerequisites
+    return cached_body(tracer, key, concept,
+                       lambda: trace(concept, max_depth, include_paths=include_paths, budget=budget, policy=policy))
+
+
+def neighborhood_body(tracer: PathTracer, concept: str, back_depth: int, forward_depth: int,
+                      include_paths: bool = False) -> bytes:
+    """serialized bidirectional neighborhood, through the same LRU cache as traces"""
+    key = ('both', concept, back_depth, forward_depth, include_paths)
+    return cached_body(tracer, key, concept,
+                       lambda: tracer.neighborhood(concept, back_depth, forward_depth, include_paths))
+
+
+def cached_body(tracer: PathTracer, key, concept: str, compute) -> bytes:
+    """compute() serialized, or the cached bytes for key; records trace metrics"""
+    concept_traces.inc((concept,))
+    body = trace_cache.get(key)
+    if body is None:
+        start = time.perf_counter()
+        result = compute()
+        body = json.dumps(result).encode()
+        trace_seconds.observe(time.perf_counter() - start)
+        trace_nodes.observe(len(result.get('all_nodes', ())))
+        trace_cache.put(key, body, owner=tracer)
+    return body
+
+
+def load_tracer(graph_path: str, warm_budget_mb: float = 0, warm_depth: int = 5):
+    """
+    (re)load the knowledge graph and swap it in.
+
+    the new tracer is fully built before anything changes; the cache is
+    handed to it first and the global reference flips last, so requests
+    never see a half-loaded graph or a trace cached from the old one.
+    """
+    global tracer
+    new_tracer = PathTracer(graph_path, warm_budget_mb=warm_budget_mb, warm_depth=warm_depth)
+    trace_cache.clear(owner=new_tracer)
+    tracer = new_tracer
+    return new_tracer
+
+
+class GraphReloader:
+    """
+    rebuilds the tracer from the graph file in a background thread.
+
+    requests keep being served by the current tracer while the new one
+    loads; a failed reload (e.g. a half-written JSON) keeps the old graph.
+    """
+
+    def __init__(self, graph_path: str, warm_budget_mb: float = 0, warm_depth: int = 5):
+        self.graph_path = graph_path
+        self.warm_budget_mb = warm_budget_mb
+        self.warm_depth = warm_depth
+        self.generation = 0
+        self.reloading = False
+        self.last = None
+        self._stat = None
+        self._lock = threading.Lock()
+
+    def _file_stat(self):
+        """(mtime, size) of the graph file, or None if it is missing"""
+        try:
+            st = os.stat(self.graph_path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def load(self):
+        """load the graph in the calling thread and swap it in"""
+        start = time.perf_counter()
+        stat = self._file_stat()
+        try:
+            new_tracer = load_tracer(self.graph_path, self.warm_budget_mb, self.warm_depth)
+        except Exception as e:
+            self.last = {'generation': self.generation, 'error': str(e),
+                         'at': time.strftime('%Y-%m-%dT%H:%M:%S')}
+            raise
+        finally:
+            self._stat = stat  # don't retry the same file contents
+        self.generation += 1
+        self.last = {
+            'generation': self.generation,
+            'nodes': len(new_tracer.nodes),
+            'edges': new_tracer.edge_count,
+            'seconds': round(time.perf_counter() - start, 3),
+            'at': time.strftime('%Y-%m-%dT%H:%M:%S')
+        }
+        return new_tracer
+
+    def reload_async(self) -> bool:
+        """start a background reload; False if one is already running"""
+        with self._lock:
+            if self.reloading:
+                return False
+            self.reloading = True
+        threading.Thread(target=self._reload, name='graph-reload', daemon=True).start()
+        return True
+
+    def _reload(self):
+        print(f"Reloading knowledge graph from {self.graph_path}...")
+        try:
+            self.load()
+            print(f"Graph reloaded (generation {self.generation}) in {self.last['seconds']:.2f}s")
+        except Exception as e:
+            print(f"Graph reload failed, still serving generation {self.generation}: {e}")
+        finally:
+            with self._lock:
+                self.reloading = False
+
+    def watch(self, interval: float):
+        """
+        poll the graph file and reload after it changes. a change must hold
+        for one whole interval first, so a file still being written is
+        not picked up halfway.
+        """
+        def poll():
+            pending = None
+            while True:
+                time.sleep(interval)
+                stat = self._file_stat()
+                if stat is None or stat == self._stat:
+                    pending = None
+                elif stat == pending:
+                    if self.reload_async():
+                        pending = None
+                else:
+                    pending = stat
+
+        threading.Thread(target=poll, name='graph-watch', daemon=True).start()
+
+    def status(self) -> dict:
+        return {'generation': self.generation, 'reloading': self.reloading, 'last': self.last}
+
+
+# global reloader (set up in main)
+reloader = None
+# shared secret for /api/admin/*; without one only loopback clients are admitted
+admin_token = None
+
+
 class FunnelAPIHandler(SimpleHTTPRequestHandler):
     """HTTP handler with API endpoints"""
 
+    # a connection that sends nothing (browser preconnects, stalled clients)
+    # gives its pool worker back after this many seconds
+    timeout = 30
+
     def __init__(self, *args, **kwargs):
         # serve from parent directory (where funnel.html is)
         super().__init__(*args, directory=str(Path(__file__).parent.parent), **kwargs)
 
+    def setup(self):
+        super().setup()
+        self.wfile = CountingWriter(self.wfile)
+
+    def handle_one_request(self):
+        """handle a request and record its route, status, latency and size"""
+        start = time.perf_counter()
+        self.wfile.bytes = 0
+        self.status = None
+        super().handle_one_request()
+        if self.status is not None:
+            route = route_of(getattr(self, 'path', ''))
+            requests_total.inc((route, self.command or '-', str(self.status)))
+            request_seconds.observe(time.perf_counter() - start, (route,))
+            response_bytes.observe(self.wfile.bytes, (route,))
+
+    def send_response(self, code, message=None):
+        self.status = code
+        super().send_response(code, message)
+
     def do_GET(self):
         parsed = urlparse(self.path)
         path = parsed.path
+        self.tracer = tracer
 
         if path == '/api/trace':
             self.handle_trace(parsed)
+        elif path == '/api/enables':
+            self.handle_trace(parsed, direction='enables')
+        elif path == '/api/neighborhood':
+            self.handle_neighborhood(parsed)
         elif path == '/api/concepts':
-            self.handle_concepts()
+            self.handle_concepts(parsed)
+        elif path == '/api/search':
+            self.handle_search(parsed)
         elif path == '/api/health':
-            self.send_json({'status': 'ok', 'nodes': len(tracer.nodes)})
+            self.send_json({
+                'status': 'ok',
+                'nodes': len(self.tracer.nodes),
+                'cache': trace_cache.stats(),
+                'warm': self.tracer.warm_report,
+                'reload': reloader.status() if reloader else None
+            })
+        elif path == '/api/metrics':
+            self.send_bytes(metrics.render().encode(), METRICS_CONTENT_TYPE)
         else:
             # serve static files
             super().do_GET()
 
-    def handle_trace(self, parsed):
-        """handle trace request"""
+    def handle_trace(self, parsed, direction: str = 'prereqs'):
+        """handle trace request (prerequisites, or direction='enables' for a forward trace)"""
         params = parse_qs(parsed.query)
         question = params.get('q', [''])[0]
 
@@ -55,63 +560,569 @@ class FunnelAPIHandler(SimpleHTTPRequestHandler):
             return
 
         try:
-            result = tracer.question_to_path(question)
-            self.send_json(result)
+            max_depth = int(params.get('max_depth', ['5'])[0])
+        except ValueError:
+            self.send_json({'error': 'max_depth must be an integer'}, 400)
+            return
+        include_paths = params.get('paths', ['0'])[0] in ('1', 'true')
+        stream = params.get('stream', ['0'])[0] in ('1', 'true')
+        budget, policy, error = trace_budget(params.get('budget', [None])[0], params.get('policy', [None])[0])
+        if error:
+            self.send_json({'error': error}, 400)
+            return
+
+        try:
+            concept = self.tracer.resolve_question(question)
+            if concept is None:
+                self.send_json({"error": "Could not map question to concept", "question": question})
+                return
+
+            if stream:
+                concept_traces.inc((concept,))
+                self.send_json_stream(self.tracer.iter_trace_json(concept, max_depth, include_paths,
+                                                                  budget, policy, direction))
+                return
+            self.send_json_bytes(trace_body(self.tracer, concept, max_depth, include_paths, budget, policy,
+                                            direction), memoize=True)
+        except Exception as e:
+            self.send_json({'error': str(e)}, 500)
+
+    def handle_neighborhood(self, parsed):
+        """prerequisites (back) and dependents (forward) of a question's concept"""
+        params = parse_qs(parsed.query)
+        question = params.get('q', [''])[0]
+
+        if not question:
+            self.send_json({'error': 'Missing question parameter ?q='}, 400)
+            return
+
+        try:
+            back_depth = int(params.get('back', ['2'])[0])
+            forward_depth = int(params.get('forward', ['2'])[0])
+        except ValueError:
+            self.send_json({'error': 'back and forward must be integers'}, 400)
+            return
+        include_paths = params.get('paths', ['0'])[0] in ('1', 'true')
+
+        concept = self.tracer.resolve_question(question)
+        if concept is None:
+            self.send_json({"error": "Could not map question to concept", "question": question})
+            return
+        self.send_json_bytes(neighborhood_body(self.tracer, concept, back_depth, forward_depth, include_paths),
+                             memoize=True)
+
+    def do_POST(self):
+        parsed = urlparse(self.path)
+        self.tracer = tracer
+
+        if parsed.path == '/api/trace/batch':
+            self.handle_trace_batch(parsed)
+        elif parsed.path == '/api/plan':
+            self.handle_plan()
+        elif parsed.path == '/api/admin/reload':
+            self.handle_reload()
+        else:
+            self.send_json({'error': f'Unknown endpoint {parsed.path}'}, 404)
+
+    def do_OPTIONS(self):
+        """CORS preflight for JSON POSTs from the visualizations"""
+        self.send_response(204)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, X-Admin-Token')
+        self.end_headers()
+
+    def read_json_body(self):
+        """parse the request body as JSON, or send a 400 and return None"""
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:  # includes JSONDecodeError
+            body = None
+        if not isinstance(body, dict):
+            self.send_json({'error': 'Request body must be a JSON object'}, 400)
+            return None
+        return body
+
+    def is_admin(self) -> bool:
+        """X-Admin-Token matches --admin-token, or (with no token set) a loopback client"""
+        if admin_token:
+            # compare bytes: compare_digest rejects non-ASCII str (headers arrive as latin-1)
+            supplied = self.headers.get('X-Admin-Token', '').encode('latin-1', 'replace')
+            return hmac.compare_digest(supplied, admin_token.encode())
+        return self.client_address[0] in ('127.0.0.1', '::1')
+
+    def handle_reload(self):
+        """rebuild the graph in the background; answers before the reload finishes"""
+        if not self.is_admin():
+            self.send_json({'error': 'Forbidden'}, 403)
+            return
+        started = reloader.reload_async()
+        self.send_json({
+            'status': 'reloading' if started else 'already reloading',
+            'generation': reloader.generation
+        }, 202)
+
+    def handle_trace_batch(self, parsed):
+        """
+        trace many questions and/or concepts in one request.
+
+        items resolving to the same concept are traced once, and every
+        trace goes through the shared LRU cache, so a concept repeated
+        across requests is served from cache. distinct concepts are traced
+        separately even when their prerequisites overlap: each trace keeps
+        its own BFS visit order and parents, so one traversal can't serve
+        two roots, and BFS is a small share of a batch next to building
+        and encoding the payloads.
+        results keep request order: questions first, then concepts;
+        ?format=ndjson writes each line as soon as it is traced.
+        """
+        body = self.read_json_body()
+        if body is None:
+            return
+
+        questions = body.get('questions', [])
+        concepts = body.get('concepts', [])
+        if not is_str_list(questions) or not is_str_list(concepts):
+            self.send_json({'error': 'questions and concepts must be lists of strings'}, 400)
+            return
+        if len(questions) + len(concepts) > MAX_BATCH:
+            self.send_json({'error': f'At most {MAX_BATCH} items per batch'}, 400)
+            return
+        try:
+            max_depth = int(body.get('max_depth', 5))
+        except (TypeError, ValueError, OverflowError):
+            self.send_json({'error': 'max_depth must be an integer'}, 400)
+            return
+        include_paths = bool(body.get('paths', False))
+        budget, policy, error = trace_budget(body.get('budget'), body.get('policy'))
+        if error:
+            self.send_json({'error': error}, 400)
+            return
+        direction = body.get('direction', 'prereqs')
+        if direction not in TRACE_DIRECTIONS:
+            self.send_json({'error': f"direction must be one of {', '.join(TRACE_DIRECTIONS)}"}, 400)
+            return
+
+        # resolve every item first (cheap); each distinct concept is traced once
+        try:
+            items = [('question', q, self.tracer.resolve_question(q)) for q in questions]
+            items += [('concept', c, c if c in self.tracer.nodes else None) for c in concepts]
         except Exception as e:
             self.send_json({'error': str(e)}, 500)
+            return
+        traces = {}
+
+        def result_lines():
+            """one JSON line per item, traced on demand; cached trace bytes are spliced in as-is"""
+            for kind, query, concept in items:
+                head = json.dumps({'kind': kind, 'query': query, 'concept': concept})[:-1].encode()
+                if concept is None:
+                    message = 'Could not map question to concept' if kind == 'question' else f"Concept '{query}' not found"
+                    yield head + b', ' + json.dumps({'error': message})[1:].encode()
+                    continue
+                if concept not in traces:
+                    traces[concept] = trace_body(self.tracer, concept, max_depth, include_paths, budget, policy,
+                                                 direction)
+                yield head + b', "trace": ' + traces[concept] + b'}'
+
+        params = parse_qs(parsed.query)
+        if params.get('format', [''])[0] == 'ndjson':
+            # each line goes out as soon as its trace is ready
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            try:
+                for line in result_lines():
+                    self.wfile.write(line + b'\n')
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # client went away
+            except Exception as e:
+                # the status line is gone; a final error line ends the stream
+                self.wfile.write(json.dumps({'error': str(e)}).encode() + b'\n')
+            return
+
+        try:
+            lines = list(result_lines())
+        except Exception as e:
+            self.send_json({'error': str(e)}, 500)
+            return
+        self.send_json_bytes(b'{"count": %d, "unique_concepts": %d, "results": [' % (len(lines), len(traces))
+                             + b', '.join(lines) + b']}')
+
+    def handle_plan(self):
+        """
+        learning plan over several targets: one student via "known",
+        or a whole roster via "students" (merged DAG computed once)
+        """
+        body = self.read_json_body()
+        if body is None:
+            return
+
+        targets = body.get('targets')
+        if not is_str_list(targets) or not targets:
+            self.send_json({'error': 'targets must be a non-empty list of concept strings'}, 400)
+            return
+        try:
+            max_depth = int(body.get('max_depth', 5))
+        except (TypeError, ValueError, OverflowError):
+            self.send_json({'error': 'max_depth must be an integer'}, 400)
+            return
+        if max_depth < 0:
+            self.send_json({'error': 'max_depth must be at least 0'}, 400)
+            return
+
+        students = body.get('students')
+        if students is None:
+            known = body.get('known') or []
+            if not is_str_list(known):
+                self.send_json({'error': 'known must be a list of concept strings'}, 400)
+                return
+            result = self.tracer.generate_plan(targets, known, max_depth)
+        elif (not isinstance(students, dict) or len(students) > MAX_ROSTER
+                or not all(known is None or is_str_list(known) for known in students.values())):
+            self.send_json({'error': f'students must map up to {MAX_ROSTER} names to lists of known concepts'},
+                           400)
+            return
+        else:
+            result = self.tracer.plan_for_roster(targets, students, max_depth)
+
+        self.send_json(result, 404 if 'error' in result else 200)
+
+    def handle_search(self, parsed):
+        """top-k fuzzy concept matches with scores"""
+        params = parse_qs(parsed.query)
+        query = params.get('q', [''])[0]
+
+        if not query:
+            self.send_json({'error': 'Missing query parameter ?q='}, 400)
+            return
+
+        try:
+            k = min(int(params.get('k', ['10'])[0]), 50)
+        except ValueError:
+            self.send_json({'error': 'k must be an integer'}, 400)
+            return
 
-    def handle_concepts(self):
-        """return list of all concepts"""
-        concepts = [
-            {'id': cid, 'count': cdata.get('count', 0), 'scale': cdata.get('scale', 'unknown')}
-            for cid, cdata in tracer.nodes.items()
-            if cdata.get('type') == 'topic' and cdata.get('count', 0) >= 10
-        ]
-        concepts.sort(key=lambda x: -x['count'])
-        self.send_json({'concepts': concepts[:100]})
+        self.send_json({'query': query, 'matches': self.tracer.search_concepts(query, k)})
+
+    def handle_concepts(self, parsed):
+        """one page of topics; defaults match the old top-100, count >= 10 list"""
+        params = parse_qs(parsed.query)
+        try:
+            offset = max(0, int(params.get('offset', ['0'])[0]))
+            limit = min(max(0, int(params.get('limit', ['100'])[0])), MAX_CONCEPTS_PAGE)
+            min_count = int(params.get('min_count', ['10'])[0])
+        except ValueError:
+            self.send_json({'error': 'offset, limit and min_count must be integers'}, 400)
+            return
+
+        scale = params.get('scale', [''])[0].upper() or None
+        if scale is not None and scale not in SCALE_ORDER:
+            self.send_json({'error': f"scale must be one of {', '.join(SCALE_ORDER)}"}, 400)
+            return
+        sort = params.get('sort', ['count'])[0]
+        if sort not in CONCEPT_SORTS:
+            self.send_json({'error': f"sort must be one of {', '.join(CONCEPT_SORTS)}"}, 400)
+            return
+
+        self.send_json(self.tracer.list_concepts(offset, limit, scale, min_count,
+                                                 params.get('prefix', [''])[0], sort))
 
     def send_json(self, data, status=200):
         """send JSON response"""
+        self.send_json_bytes(json.dumps(data).encode(), status)
+
+    def send_json_bytes(self, body: bytes, status=200, memoize: bool = False):
+        """send an already-serialized JSON response"""
+        self.send_bytes(body, 'application/json', status, memoize)
+
+    def send_bytes(self, body: bytes, content_type: str, status=200, memoize: bool = False):
+        """
+        send a response body, compressed if the client accepts it.
+        successful GETs carry an ETag and revalidate to a bodiless 304.
+        memoize=True keeps the compressed form in encoded_cache; only for
+        bodies that repeat (cached traces), not one-off responses.
+        """
+        digest = hashlib.blake2b(body, digest_size=12).hexdigest()
+        etag = f'"{digest}"' if self.command == 'GET' and status == 200 else None
+        if etag and etag_matches(self.headers.get('If-None-Match'), etag):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Vary', 'Accept-Encoding')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            return
+
+        compressible = len(body) >= COMPRESS_MIN_BYTES
+        accepted = accepted_encodings(self.headers.get('Accept-Encoding')) if compressible else []
+        encoding = accepted[0][0] if accepted else None
+        if encoding:
+            key = (digest, encoding)
+            encoded = encoded_cache.get(key) if memoize else None
+            if encoded is None:
+                encoded = compress(body, encoding)
+                if memoize:
+                    encoded_cache.put(key, encoded)
+            body = encoded
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        if compressible:
+            self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        if etag:
+            self.send_header('ETag', with_coding(etag, encoding))
+            self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json_stream(self, fragments, status=200):
+        """
+        send JSON text fragments with chunked transfer encoding, about
+        STREAM_CHUNK_BYTES per chunk, so the client can parse the head of
+        a large trace while the rest is still being encoded.
+
+        chunking needs HTTP/1.1, so this one response upgrades and closes
+        the connection afterwards; HTTP/1.0 clients get a plain response.
+        gzip (if accepted) is flushed per chunk. an error before the first
+        fragment propagates (nothing is sent yet); one after the headers
+        drops the connection without the final chunk, so the client sees
+        a truncated body rather than a second status line.
+        """
+        if self.request_version != 'HTTP/1.1':
+            self.send_json_bytes(''.join(fragments).encode(), status)
+            return
+
+        fragments = iter(fragments)
+        first = next(fragments, '')
+
+        self.protocol_version = 'HTTP/1.1'
+        self.close_connection = True
+        gzipped = any(enc == 'gzip' for enc, _ in accepted_encodings(self.headers.get('Accept-Encoding')))
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzipped else None
+
         self.send_response(status)
         self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Connection', 'close')
         self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Vary', 'Accept-Encoding')
+        if compressor:
+            self.send_header('Content-Encoding', 'gzip')
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+
+        def write_chunk(data: bytes, final: bool = False):
+            if compressor:
+                data = compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+            if data:
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+        buffered, size = [first.encode()], len(first)
+        try:
+            for fragment in fragments:
+                data = fragment.encode()
+                buffered.append(data)
+                size += len(data)
+                if size >= STREAM_CHUNK_BYTES:
+                    write_chunk(b''.join(buffered))
+                    self.wfile.flush()
+                    buffered, size = [], 0
+            write_chunk(b''.join(buffered), final=True)
+            self.wfile.write(b'0\r\n\r\n')
+        except Exception as e:
+            self.log_error("%s", f"stream aborted: {e}")
+
+    def send_head(self):
+        """
+        static files: serve a precompressed .br/.gz variant when the client
+        accepts it and it is at least as new as the file, with an ETag
+        from size and mtime so repeat loads revalidate to 304.
+        directories and missing files fall back to the stock handler.
+        """
+        path = self.translate_path(self.path)
+        if urlparse(self.path).path.endswith('/') or not os.path.isfile(path):
+            return super().send_head()
+        try:
+            st = os.stat(path)
+        except OSError:
+            return super().send_head()
+
+        etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+        if 'If-None-Match' in self.headers:
+            not_modified = etag_matches(self.headers['If-None-Match'], etag)
+        else:
+            not_modified = self.headers.get('If-Modified-Since') == self.date_time_string(st.st_mtime)
+        if not_modified:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            return None
+
+        served, encoding = path, None
+        for enc, suffix in accepted_encodings(self.headers.get('Accept-Encoding')):
+            variant = path + suffix
+            try:
+                if os.stat(variant).st_mtime_ns >= st.st_mtime_ns:
+                    served, encoding = variant, enc
+                    break
+            except OSError:
+                continue
+
+        try:
+            f = open(served, 'rb')
+        except OSError:
+            self.send_error(404, "File not found")
+            return None
+        self.send_response(200)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Length', str(os.fstat(f.fileno()).st_size))
+        self.send_header('Last-Modified', self.date_time_string(st.st_mtime))
+        self.send_header('ETag', with_coding(etag, encoding))
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+        return f
 
     def log_message(self, format, *args):
         """custom logging"""
         print(f"[API] {args[0]}")
 
 
-def main():
-    global tracer
+class PooledHTTPServer(HTTPServer):
+    """
+    HTTP server that hands each connection to a bounded worker pool.
+
+    all workers share the loaded PathTracer (read-only after load; a
+    reload builds a new one and swaps the reference).
+
+    an idle connection holds a worker for at most the handler's timeout,
+    so with --workers 4, four silent sockets delay other requests by up
+    to that long rather than forever. server_close() stops accepting,
+    gives queued and in-flight requests drain_seconds to finish, then
+    shuts down whatever connections remain.
+    """
 
+    # a whole class opening the page at once shouldn't hit the default backlog of 5
+    request_queue_size = 128
+    drain_seconds = 10
+
+    def __init__(self, server_address, handler_class, workers: int = 8):
+        super().__init__(server_address, handler_class)
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="funnel-worker")
+        self._connections = set()  # queued or in-flight sockets
+        self._connections_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        """queue the connection for a worker instead of handling it inline"""
+        with self._connections_lock:
+            self._connections.add(request)
+        self.pool.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._connections_lock:
+                self._connections.discard(request)
+
+    def server_close(self):
+        """close the listening socket, drain for drain_seconds, then cut off the rest"""
+        super().server_close()
+        deadline = time.monotonic() + self.drain_seconds
+        while self._connections and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        with self._connections_lock:
+            remaining = list(self._connections)
+        for request in remaining:
+            try:
+                request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass  # already closed by its worker
+        if remaining:
+            print(f"Closed {len(remaining)} connections still open after {self.drain_seconds}s")
+        self.pool.shutdown(wait=True)
+
+
+def main():
     import argparse
     parser = argparse.ArgumentParser(description="Knowledge Funnel API Server")
     parser.add_argument("--port", type=int, default=8361, help="Port (default: 8361)")
-    parser.add_argument("--graph", default="/storage/inorganic-chem-class/experiments/results/chemkg_enhanced.json")
+    parser.add_argument("--graph", default="/storage/inorganic-chem-class/experiments/results/chemkg_enhanced.json",
+                        help="Knowledge graph JSON or binary snapshot (graph_snapshot.py)")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent request workers (default: 8)")
+    parser.add_argument("--cache-size", type=int, default=256,
+                        help="Max cached trace responses, 0 disables (default: 256)")
+    parser.add_argument("--warm-mb", type=float, default=0,
+                        help="Precompute topic closures at startup within this memory budget (default: off)")
+    parser.add_argument("--warm-depth", type=int, default=5, help="Depth of precomputed closures (default: 5)")
+    parser.add_argument("--watch", type=float, default=0,
+                        help="Poll --graph every N seconds and hot-reload it when it changes (default: off)")
+    parser.add_argument("--precompress", action="store_true",
+                        help="Write .gz/.br variants of static assets before serving")
+    parser.add_argument("--admin-token", default=os.environ.get("FUNNEL_ADMIN_TOKEN"),
+                        help="Token required in X-Admin-Token for /api/admin/* (default: localhost only)")
     args = parser.parse_args()
 
+    global reloader, admin_token
+    admin_token = args.admin_token
+
+    if args.precompress:
+        written, saved = precompress_static(Path(__file__).parent.parent)
+        codings = ', '.join(enc for enc, _ in ENCODINGS)
+        print(f"Precompressed {written} static variants ({codings}), {saved / 1024 / 1024:.1f} MB saved")
+
     # load graph
     print(f"Loading knowledge graph from {args.graph}...")
-    tracer = PathTracer(args.graph)
+    trace_cache.maxsize = args.cache_size
+    reloader = GraphReloader(args.graph, warm_budget_mb=args.warm_mb, warm_depth=args.warm_depth)
+    reloader.load()
+    if args.watch > 0:
+        reloader.watch(args.watch)
+        print(f"Watching {args.graph} for changes every {args.watch:g}s")
 
     # start server
-    server = HTTPServer(('0.0.0.0', args.port), FunnelAPIHandler)
+    server = PooledHTTPServer(('0.0.0.0', args.port), FunnelAPIHandler, workers=max(1, args.workers))
     print(f"\n{'='*50}")
-    print(f"Knowledge Funnel Server running on http://localhost:{args.port}")
+    print(f"Knowledge Funnel Server running on http://localhost:{args.port} ({server.workers} workers)")
     print(f"{'='*50}")
     print(f"\nEndpoints:")
     print(f"  GET /                     - Visualization")
     print(f"  GET /api/trace?q=<query>  - Trace path for question")
+    print(f"  GET /api/enables?q=<query>  - What the concept unlocks")
+    print(f"  GET /api/neighborhood?q=<query> - Prerequisites and dependents")
     print(f"  GET /api/concepts         - List all concepts")
+    print(f"  GET /api/search?q=<text>  - Fuzzy concept lookup")
+    print(f"  GET /api/metrics          - Prometheus metrics")
+    print(f"  POST /api/trace/batch     - Trace many questions at once")
+    print(f"  POST /api/plan            - Learning plan for targets / a roster")
+    print(f"  POST /api/admin/reload    - Hot-reload the knowledge graph")
     print(f"\nPress Ctrl+C to stop\n")
 
+    # treat SIGTERM (systemd, docker stop) like Ctrl+C so requests get drained
+    def _sigterm(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, _sigterm)
+
     try:
         server.serve_forever()
     except KeyboardInterrupt:
-        print("\nShutting down...")
-        server.shutdown()
+        print("\nShutting down (draining in-flight requests)...")
+    finally:
+        server.server_close()
 
 
 if __name__ == "__main__":
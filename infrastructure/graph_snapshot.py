@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Graph Snapshot: compact binary form of the knowledge graph
+
+compiles chemkg_enhanced.json once into a single versioned file:
+an interned string table, typed node columns (count, pagerank, type,
+scale) and CSR edge arrays per relation, in both directions.
+
+loading maps the file read-only with numpy.memmap, so it takes
+milliseconds instead of a json.load, and every process serving the same
+snapshot shares one copy of the arrays through the page cache.
+
+layout: MAGIC | uint32 version | uint32 header length | JSON header |
+sections, each aligned to 64 bytes. the header records every section's
+offset (relative to the first section), dtype and shape.
+
+Usage:
+    python graph_snapshot.py ../experiments/results/chemkg_enhanced.json -o chemkg.snap
+"""
+
+import argparse
+import json
+import os
+import struct
+import time
+from pathlib import Path
+
+import numpy as np
+
+MAGIC = b'CKGSNAP\0'
+VERSION = 1
+ALIGN = 64
+
+_PREFIX = struct.Struct('<8sII')  # magic, version, header length
+
+
+def build_csr(rows: list, cols: list, n: int, weights: list = None):
+    """
+    compressed sparse row adjacency: neighbours of i are
+    indices[offsets[i]:offsets[i + 1]], in original edge order.
+    returns (offsets, indices, weights); weights default to 1.
+    """
+    rows = np.asarray(rows, dtype=np.int32)
+    cols = np.asarray(cols, dtype=np.int32)
+    weights = np.asarray(weights if weights is not None else np.ones(len(rows)), dtype=np.float32)
+    order = np.argsort(rows, kind='stable')
+    offsets = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(np.bincount(rows, minlength=n), out=offsets[1:])
+    return offsets, cols[order], weights[order]
+
+
+def _pack_strings(strings: list):
+    """utf-8 blob plus int64 byte offsets: string i is blob[offsets[i]:offsets[i + 1]]"""
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+
+def _unpack_strings(offsets, blob) -> list:
+    data = blob.tobytes()
+    bounds = offsets.tolist()
+    return [data[bounds[i]:bounds[i + 1]].decode('utf-8') for i in range(len(bounds) - 1)]
+
+
+def is_snapshot(path) -> bool:
+    """True if path starts with the snapshot magic"""
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class GraphSnapshot:
+    """
+    interned, columnar view of a knowledge graph.
+
+    ids 0..node_count-1 are graph nodes in file order (a repeated id keeps
+    its first position and its last attributes); names seen only as edge
+    endpoints follow. columns cover every name, with count/pagerank 0 and
+    type -1 for the edge-only ones.
+    """
+
+    def __init__(self, header: dict, arrays: dict, names: list, labels: list):
+        self.header = header
+        self.arrays = arrays
+        self.names = names
+        self.labels = labels
+        self.node_count = header['node_count']
+        self.edge_count = header['edge_count']
+        self.types = header['types']
+        self.scales = header['scales']
+        self.relations = header['relations']
+        self.counts = arrays['node.count']
+        self.pageranks = arrays['node.pagerank']
+        self.type_codes = arrays['node.type']
+        self.scale_codes = arrays['node.scale']
+
+    def csr(self, relation: str, direction: str = 'out'):
+        """
+        (offsets, indices, weights) for one relation. 'out' lists targets
+        per source, 'in' lists sources per target. a relation absent from
+        the graph yields an empty adjacency.
+        """
+        prefix = f'{relation}.{direction}'
+        if f'{prefix}.offsets' not in self.arrays:
+            n = len(self.names)
+            return (np.zeros(n + 1, dtype=np.int32), np.zeros(0, dtype=np.int32),
+                    np.zeros(0, dtype=np.float32))
+        return (self.arrays[f'{prefix}.offsets'], self.arrays[f'{prefix}.indices'],
+                self.arrays[f'{prefix}.weights'])
+
+    def save(self, path):
+        """write the snapshot atomically (a temp file renamed over path)"""
+        sections = {}
+        blobs = []
+        offset = 0
+        for key, arr in self.arrays.items():
+            arr = np.ascontiguousarray(arr)
+            offset = -(-offset // ALIGN) * ALIGN
+            sections[key] = {'offset': offset, 'dtype': arr.dtype.str, 'shape': list(arr.shape)}
+            blobs.append((offset, arr.tobytes()))
+            offset += arr.nbytes
+
+        header = dict(self.header, version=VERSION, sections=sections)
+        header_bytes = json.dumps(header).encode('utf-8')
+        data_start = -(-(_PREFIX.size + len(header_bytes)) // ALIGN) * ALIGN
+
+        tmp = f'{path}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(_PREFIX.pack(MAGIC, VERSION, len(header_bytes)))
+            f.write(header_bytes)
+            for rel_offset, data in blobs:
+                f.seek(data_start + rel_offset)
+                f.write(data)
+            f.truncate(data_start + offset)
+        os.replace(tmp, path)
+
+
+def compile_graph(graph: dict, classify, scales: list, source: str = '') -> GraphSnapshot:
+    """
+    build a snapshot from a parsed graph JSON.
+
+    classify(name) -> scale name fills in the scale of nodes without a
+    persisted 'scale' (and of edge-only names); scales fixes the codes.
+    """
+    scale_code = {s: i for i, s in enumerate(scales)}
+
+    # last attributes win, first position is kept (dict semantics)
+    nodes = {}
+    for n in graph['nodes']:
+        nodes[n['id']] = n
+    names = list(nodes)
+    index = {name: i for i, name in enumerate(names)}
+
+    def intern(name):
+        i = index.get(name)
+        if i is None:
+            i = index[name] = len(names)
+            names.append(name)
+        return i
+
+    edges = {}  # relation -> (sources, targets, weights)
+    for e in graph['edges']:
+        relation = e.get('relation')
+        if not relation:
+            continue
+        sources, targets, weights = edges.setdefault(relation, ([], [], []))
+        targets.append(intern(e['target']))
+        sources.append(intern(e['source']))
+        weights.append(e.get('weight', 1))
+
+    n = len(names)
+    types = sorted({node.get('type', 'concept') for node in nodes.values()})
+    type_code = {t: i for i, t in enumerate(types)}
+
+    counts = np.zeros(n, dtype=np.int32)
+    pageranks = np.zeros(n, dtype=np.float64)
+    type_codes = np.full(n, -1, dtype=np.int8)
+    scale_codes = np.zeros(n, dtype=np.int8)
+    for i, name in enumerate(names):
+        node = nodes.get(name)
+        scale = None
+        if node is not None:
+            counts[i] = node.get('count', 0)
+            pageranks[i] = node.get('pagerank', 0)
+            type_codes[i] = type_code[node.get('type', 'concept')]
+            scale = node.get('scale')
+        scale_codes[i] = scale_code[scale if scale in scale_code else classify(name)]
+
+    node_names = names[:len(nodes)]
+    labels = [str(nodes[name].get('label', name)) for name in node_names]
+    name_offsets, name_blob = _pack_strings(names)
+    label_offsets, label_blob = _pack_strings(labels)
+    arrays = {
+        'names.offsets': name_offsets,
+        'names.blob': name_blob,
+        'labels.offsets': label_offsets,
+        'labels.blob': label_blob,
+        'node.count': counts,
+        'node.pagerank': pageranks,
+        'node.type': type_codes,
+        'node.scale': scale_codes,
+    }
+    for relation, (sources, targets, weights) in edges.items():
+        for direction, rows, cols in (('out', sources, targets), ('in', targets, sources)):
+            offsets, indices, w = build_csr(rows, cols, n, weights)
+            arrays[f'{relation}.{direction}.offsets'] = offsets
+            arrays[f'{relation}.{direction}.indices'] = indices
+            arrays[f'{relation}.{direction}.weights'] = w
+
+    header = {
+        'version': VERSION,
+        'node_count': len(nodes),
+        'name_count': n,
+        'edge_count': len(graph['edges']),
+        'types': types,
+        'scales': list(scales),
+        'relations': {r: len(v[0]) for r, v in edges.items()},
+        'source': source,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    return GraphSnapshot(header, arrays, names, labels)
+
+
+def load_snapshot(path) -> GraphSnapshot:
+    """map a snapshot file read-only; arrays are views into the mapping"""
+    with open(path, 'rb') as f:
+        magic, version, header_len = _PREFIX.unpack(f.read(_PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a graph snapshot")
+        if version != VERSION:
+            raise ValueError(f"{path}: snapshot version {version}, expected {VERSION}; rebuild it")
+        header = json.loads(f.read(header_len))
+
+    data_start = -(-(_PREFIX.size + header_len) // ALIGN) * ALIGN
+    mapped = np.memmap(path, dtype=np.uint8, mode='r')
+    arrays = {}
+    for key, sec in header['sections'].items():
+        dtype = np.dtype(sec['dtype'])
+        count = int(np.prod(sec['shape']))
+        start = data_start + sec['offset']
+        arrays[key] = mapped[start:start + count * dtype.itemsize].view(dtype).reshape(sec['shape'])
+
+    names = _unpack_strings(arrays['names.offsets'], arrays['names.blob'])
+    labels = _unpack_strings(arrays['labels.offsets'], arrays['labels.blob'])
+    return GraphSnapshot(header, arrays, names, labels)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile the knowledge graph JSON into a binary snapshot')
+    parser.add_argument('graph', help='Path to knowledge graph JSON')
+    parser.add_argument('-o', '--output', help='Snapshot path (default: graph path with .snap)')
+    args = parser.parse_args()
+
+    # scale rules live with the tracer; imported here to keep loading cycle-free
+    from path_tracer import SCALE_ORDER, infer_scale
+
+    out = args.output or str(Path(args.graph).with_suffix('.snap'))
+    start = time.perf_counter()
+    with open(args.graph) as f:
+        graph = json.load(f)
+    snap = compile_graph(graph, infer_scale, SCALE_ORDER, source=Path(args.graph).name)
+    snap.save(out)
+    built = time.perf_counter() - start
+
+    start = time.perf_counter()
+    load_snapshot(out)
+    loaded = time.perf_counter() - start
+
+    print(f"Wrote {out}: {snap.node_count} nodes, {len(snap.names)} names, "
+          f"{snap.edge_count} edges, {os.path.getsize(out) / 1024:.0f} KB")
+    print(f"  relations: {', '.join(f'{r} ({c})' for r, c in snap.relations.items())}")
+    print(f"  compiled in {built * 1000:.0f} ms, loads in {loaded * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
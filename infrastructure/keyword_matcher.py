@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Keyword Matcher: multi-pattern substring matching (Aho-Corasick)
+
+compiles a fixed keyword list into one automaton so every keyword
+occurring in a text is found in a single pass over the text,
+independent of how many keywords there are.
+
+matching is case-insensitive and plain substring (no word boundaries),
+the same semantics as `kw in text.lower()`.
+"""
+
+from collections import deque
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over a fixed keyword list.
+
+    keywords keep their list position as a priority: first() returns the
+    earliest-listed keyword that occurs, mirroring an ordered
+    `for kw in keywords: if kw in text` scan.
+    """
+
+    def __init__(self, keywords: list):
+        self.keywords = [kw.lower() for kw in keywords]
+
+        # trie: goto[state][char] -> state, out[state] -> keyword indices
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+        for i, kw in enumerate(self.keywords):
+            if not kw:
+                continue  # an empty keyword would match everything
+            state = 0
+            for ch in kw:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][ch] = nxt
+                state = nxt
+            self._out[state].append(i)
+
+        # failure links, breadth-first (children of the root fail to the root)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def iter_matches(self, text: str):
+        """yield (start, keyword index) for every keyword occurrence in text"""
+        goto, fail, out, keywords = self._goto, self._fail, self._out, self.keywords
+        state = 0
+        for pos, ch in enumerate(text.lower()):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for i in out[state]:
+                yield pos - len(keywords[i]) + 1, i
+
+    def matches(self, text: str) -> set:
+        """indices of all keywords that occur in text"""
+        return {i for _, i in self.iter_matches(text)}
+
+    def first(self, text: str):
+        """index of the earliest-listed keyword occurring in text, or None"""
+        return min(self.matches(text), default=None)
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Load Test: concurrent-student benchmark for the Knowledge Funnel API
+
+replays a classroom-like mix of requests against api_server.py:
+  - /api/trace with questions drawn from the quiz bank (question stems
+    from data/quizzes/) and module topics (data/quiz_config.json)
+  - /api/concepts pages and autocomplete prefixes
+  - static fetches of the visualization pages, data and figures
+
+each simulated student is a thread issuing requests back to back (or
+with --think pause). reports throughput and p50/p95/p99 latency overall
+and per request kind. by default a server is started on a free port for
+the run and stopped afterwards.
+
+Usage:
+    python load_test.py [--clients 20] [--duration 30]
+    python load_test.py --url http://localhost:8361
+    python load_test.py --save-baseline load_baseline.json
+    python load_test.py --baseline load_baseline.json [--tolerance 0.25]   # exit 1 on regression
+"""
+
+import argparse
+import json
+import math
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from urllib.parse import quote
+
+ROOT = Path(__file__).parent.parent
+DATA_DIR = ROOT / "data"
+GRAPH_FILE = ROOT / "experiments" / "results" / "chemkg_enhanced.json"
+
+# request kind -> share of traffic
+MIX = {'trace': 0.6, 'concepts': 0.2, 'static': 0.2}
+
+# static assets a student's browser pulls (missing ones are skipped)
+STATIC_PATHS = ['/funnel.html', '/index.html', '/styles.css', '/app.js',
+                '/data/context_graph.json', '/data/learning_tree.json']
+# a few figures too, as the lecture pages load them
+STATIC_FIGURES = 5
+
+
+def load_questions() -> list:
+    """quiz question stems and module topics, as students would phrase traces"""
+    questions = []
+    config = DATA_DIR / "quiz_config.json"
+    if config.exists():
+        for module in json.loads(config.read_text()).get('modules', []):
+            questions.extend(module.get('topics', []))
+    for path in sorted((DATA_DIR / "quizzes").glob("**/*.json")):
+        items = json.loads(path.read_text())
+        if isinstance(items, list):
+            questions.extend(q['question'] for q in items if isinstance(q, dict) and q.get('question'))
+    return questions
+
+
+def static_paths() -> list:
+    paths = [p for p in STATIC_PATHS if (ROOT / p.lstrip('/')).exists()]
+    figures = sorted((ROOT / "assets" / "figures").glob("*.png"))[:STATIC_FIGURES]
+    paths += ['/' + str(f.relative_to(ROOT)) for f in figures]
+    return paths
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    """nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values), math.ceil(p / 100 * len(sorted_values))) - 1)
+    return sorted_values[rank]
+
+
+class Workload:
+    """picks the next request for a student; deterministic per seed"""
+
+    def __init__(self, questions: list, statics: list, seed: int):
+        self.rng = random.Random(seed)
+        self.questions = questions
+        self.statics = statics
+        self.kinds = [k for k in MIX if k != 'static' or statics]
+        self.weights = [MIX[k] for k in self.kinds]
+
+    def next(self) -> tuple:
+        """(kind, path)"""
+        rng = self.rng
+        kind = rng.choices(self.kinds, self.weights)[0]
+        if kind == 'trace':
+            question = rng.choice(self.questions)
+            return kind, f"/api/trace?q={quote(question)}"
+        if kind == 'concepts':
+            if rng.random() < 0.5:
+                return kind, "/api/concepts"
+            # autocomplete: the first few letters of a word the student is typing
+            word = rng.choice(rng.choice(self.questions).split())
+            sort = rng.choice(['count', 'pagerank'])
+            return kind, f"/api/concepts?prefix={quote(word[:rng.randint(1, 4)])}&limit=10&min_count=0&sort={sort}"
+        return kind, rng.choice(self.statics)
+
+
+def run_load(base_url: str, clients: int, duration: float, warmup: float = 2.0,
+             think: float = 0.0, seed: int = 0) -> dict:
+    """drive the server with `clients` threads; returns the report dict"""
+    questions = load_questions()
+    if not questions:
+        raise SystemExit(f"No questions found under {DATA_DIR}")
+    statics = static_paths()
+
+    samples = []  # (kind, seconds, ok, bytes)
+    lock = threading.Lock()
+    start = time.perf_counter()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+
+    def student(i):
+        workload = Workload(questions, statics, seed * 1000 + i)
+        local = []
+        while time.perf_counter() < stop_at:
+            kind, path = workload.next()
+            request = urllib.request.Request(base_url + path, headers={'Accept-Encoding': 'gzip'})
+            t0 = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=30) as resp:
+                    size = len(resp.read())
+                ok = True
+            except (urllib.error.URLError, OSError):
+                size, ok = 0, False
+            t1 = time.perf_counter()
+            if t0 >= measure_from and t1 <= stop_at:
+                local.append((kind, t1 - t0, ok, size))
+            if think:
+                time.sleep(think)
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=student, args=(i,), daemon=True) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    def summarize(rows):
+        latencies = sorted(r[1] for r in rows if r[2])
+        errors = sum(1 for r in rows if not r[2])
+        return {
+            'requests': len(rows),
+            'errors': errors,
+            'throughput': round(len(rows) / duration, 1),
+            'bytes': sum(r[3] for r in rows),
+            'mean_ms': round(1000 * sum(latencies) / len(latencies), 2) if latencies else 0.0,
+            'p50_ms': round(1000 * percentile(latencies, 50), 2),
+            'p95_ms': round(1000 * percentile(latencies, 95), 2),
+            'p99_ms': round(1000 * percentile(latencies, 99), 2),
+        }
+
+    return {
+        'config': {'clients': clients, 'duration': duration, 'warmup': warmup,
+                   'think': think, 'seed': seed, 'questions': len(questions)},
+        'overall': summarize(samples),
+        'kinds': {kind: summarize([r for r in samples if r[0] == kind]) for kind in MIX
+                  if any(r[0] == kind for r in samples)},
+    }
+
+
+def print_report(report: dict):
+    cfg = report['config']
+    print(f"\n{cfg['clients']} clients, {cfg['duration']:g}s measured "
+          f"(after {cfg['warmup']:g}s warmup), {cfg['questions']} questions in the pool\n")
+    print(f"{'kind':<10} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    print("-" * 64)
+    for kind, row in list(report['kinds'].items()) + [('overall', report['overall'])]:
+        print(f"{kind:<10} {row['requests']:>9} {row['errors']:>7} {row['throughput']:>8.1f} "
+              f"{row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f}")
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """regressions vs a saved report: lower throughput or higher p95 beyond tolerance"""
+    problems = []
+    rows = [('overall', report['overall'], baseline.get('overall'))]
+    rows += [(k, row, baseline.get('kinds', {}).get(k)) for k, row in report['kinds'].items()]
+    for kind, now, before in rows:
+        if not before:
+            continue
+        if now['throughput'] < before['throughput'] * (1 - tolerance):
+            problems.append(f"{kind}: throughput {now['throughput']:.1f} req/s, "
+                            f"baseline {before['throughput']:.1f}")
+        if before['p95_ms'] and now['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            problems.append(f"{kind}: p95 {now['p95_ms']:.2f} ms, baseline {before['p95_ms']:.2f}")
+        if now['errors'] > before['errors']:
+            problems.append(f"{kind}: {now['errors']} errors, baseline {before['errors']}")
+    return problems
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(graph: str, workers: int, extra: list) -> tuple:
+    """launch api_server.py on a free port; returns (process, base url) once healthy"""
+    port = free_port()
+    cmd = [sys.executable, str(Path(__file__).parent / "api_server.py"),
+           '--port', str(port), '--graph', graph, '--workers', str(workers)] + extra
+    proc = subprocess.Popen(cmd, cwd=Path(__file__).parent,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"Server exited during startup (code {proc.returncode})")
+        try:
+            urllib.request.urlopen(base_url + "/api/health", timeout=2).read()
+            return proc, base_url
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit("Server did not become healthy within 60s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Knowledge Funnel API")
+    parser.add_argument("--url", help="Test a running server instead of starting one")
+    parser.add_argument("--graph", default=str(GRAPH_FILE), help="Graph for the started server")
+    parser.add_argument("--workers", type=int, default=8, help="Worker threads for the started server")
+    parser.add_argument("--server-arg", action="append", default=[],
+                        help="Extra api_server.py argument, repeatable (e.g. --server-arg=--warm-mb=50)")
+    parser.add_argument("--clients", type=int, default=20, help="Concurrent simulated students")
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=2, help="Unmeasured seconds first")
+    parser.add_argument("--think", type=float, default=0, help="Pause between a student's requests (s)")
+    parser.add_argument("--seed", type=int, default=0, help="Workload seed")
+    parser.add_argument("--save-baseline", help="Write the report as a baseline JSON")
+    parser.add_argument("--baseline", help="Compare against a baseline JSON; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed relative throughput drop / p95 rise vs baseline (default 0.25)")
+    args = parser.parse_args()
+
+    proc = None
+    base_url = args.url.rstrip('/') if args.url else None
+    if base_url is None:
+        print(f"Starting api_server.py ({args.workers} workers) on {args.graph}...")
+        proc, base_url = start_server(args.graph, args.workers, args.server_arg)
+
+    try:
+        print(f"Load testing {base_url} with {args.clients} clients for {args.duration:g}s...")
+        report = run_load(base_url, args.clients, args.duration, args.warmup, args.think, args.seed)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    report['config']['url'] = args.url or 'local'
+    print_report(report)
+
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(report, indent=2))
+        print(f"\nSaved baseline to {args.save_baseline}")
+
+    if args.baseline:
+        problems = compare(report, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        if problems:
+            print(f"\nREGRESSION vs {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for p in problems:
+                print(f"  {p}")
+            sys.exit(1)
+        print(f"\nNo regression vs {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
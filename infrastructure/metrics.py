@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Metrics: in-process counters and histograms in Prometheus text format
+
+just enough of the Prometheus data model for the API server: labelled
+counters, fixed-bucket histograms and gauges read from a callback at
+scrape time. recording is a dict update under a per-metric lock, cheap
+enough to leave on for every request.
+
+    requests = registry.counter('funnel_requests_total', 'Requests', ['route'])
+    requests.inc(('/api/trace',))
+    body = registry.render()   # text/plain; version=0.0.4
+"""
+
+import bisect
+import threading
+
+# default latency buckets (seconds): sub-millisecond cache hits up to slow traces
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# response sizes (bytes) and closure sizes (nodes) span several orders of magnitude
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+NODE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """monotonic count per label tuple"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, _labels(self.labels, key), value) for key, value in items]
+
+
+class Histogram:
+    """cumulative fixed-bucket histogram per label tuple"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # labels -> [per-bucket counts (+Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels=()):
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][slot] += 1
+            entry[1] += value
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        out = []
+        for key, (counts, total) in items:
+            running = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                running += count
+                out.append((f'{self.name}_bucket', _labels(self.labels, key, f'le="{_number(bound)}"'), running))
+            out.append((f'{self.name}_sum', _labels(self.labels, key), total))
+            out.append((f'{self.name}_count', _labels(self.labels, key), running))
+        return out
+
+
+class Gauge:
+    """
+    value read at scrape time. fn returns a number, or a list of
+    (label values, number) pairs for a labelled gauge. kind='counter'
+    exposes a total that something else already keeps.
+    """
+
+    def __init__(self, name: str, help_text: str, fn, labels=(), kind: str = 'gauge'):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.fn = fn
+        self.kind = kind
+
+    def samples(self):
+        value = self.fn()
+        if not isinstance(value, list):
+            value = [((), value)]
+        return [(self.name, _labels(self.labels, key), v) for key, v in value]
+
+
+class Registry:
+    """named collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labels=()) -> Counter:
+        return self._add(Counter(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name: str, help_text: str, fn, labels=(), kind: str = 'gauge') -> Gauge:
+        return self._add(Gauge(name, help_text, fn, labels, kind))
+
+    def render(self) -> str:
+        """all metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {_number(value)}')
+        return '\n'.join(lines) + '\n'
@@ -8,129 +8,725 @@ the knowledge graph to find all prerequisite paths.
 outputs JSON suitable for visualization (funnel/graph).
 """
 
+import bisect
+import heapq
 import json
 import sys
-from collections import defaultdict, deque
+import threading
+import time
+from collections import defaultdict
 from pathlib import Path
 
+import numpy as np
+
+from graph_snapshot import compile_graph, is_snapshot, load_snapshot
+from keyword_matcher import KeywordMatcher
+from trigram_index import TrigramIndex
+
 # scales in order (funnel layers)
 SCALE_ORDER = ['QUANTUM', 'ELECTRONIC', 'STRUCTURAL', 'DESCRIPTIVE', 'APPLICATION']
 SCALE_DEPTH = {s: i for i, s in enumerate(SCALE_ORDER)}
 
+# scale indicators by priority: the first scale with a keyword hit wins,
+# anything without a hit is DESCRIPTIVE
+SCALE_KEYWORDS = [
+    ('QUANTUM', ['quantum', 'wave function', 'orbital', 'schrodinger', 'atomic structure',
+                 'electron configuration', 'quantum number', 'spin', 'pauli']),
+    ('ELECTRONIC', ['crystal field', 'molecular orbital', 'mo theory', 'bonding',
+                    'electronic', 'd-orbital', 'splitting', 'cfse', 'ligand field',
+                    'band', 'magnetism', 'magnetic', 'spectroscopy', 'color']),
+    ('STRUCTURAL', ['symmetry', 'point group', 'geometry', 'structure', 'crystal',
+                    'coordination', 'isomer', 'lattice', 'unit cell', 'packing']),
+    ('APPLICATION', ['application', 'industrial', 'biological', 'catalysis', 'material',
+                     'environmental', 'medicine', 'synthesis', 'reaction mechanism']),
+]
+
+# question keyword -> concept to trace (earlier entries win)
+QUESTION_CONCEPTS = {
+    'color': 'Color And Magnetism Of Coordination Compounds',
+    'blue': 'Crystal Field Theory',
+    'magnetic': 'Magnetic Properties Of Transition Metals',
+    'crystal field': 'Crystal Field Theory',
+    'splitting': 'Crystal Field Theory',
+    'orbital': 'Molecular Orbital Theory',
+    'symmetry': 'Molecular Symmetry And Group Theory',
+    'point group': 'Symmetry And Point Groups',
+    'solid': 'Solid State Chemistry',
+    'lattice': 'Crystal Structures',
+    'acid': 'Acid-Base Chemistry',
+    'redox': 'Redox Chemistry',
+    'periodic': 'Periodic Trends',
+}
+
+# minimum search score for find_concept to count a name as a match
+FIND_MIN_SCORE = 0.45
+
+# orderings offered by list_concepts
+CONCEPT_SORTS = ('count', 'pagerank')
+
+# trace directions: back to prerequisites, or forward to what a concept enables
+TRACE_DIRECTIONS = ('prereqs', 'enables')
+
+# budgeted traces: score of reaching a prerequisite through an edge.
+# pagerank is smoothed by 1/n (many nodes have none) and each extra hop
+# multiplies the score by TRACE_DEPTH_DECAY.
+TRACE_DEPTH_DECAY = 0.5
+TRACE_POLICIES = {
+    'pagerank': lambda pagerank, weight, decay: pagerank * weight * decay,
+    'weight': lambda pagerank, weight, decay: weight * decay,
+    'depth': lambda pagerank, weight, decay: decay,
+}
+
+# both vocabularies compile to one automaton each; keyword position = priority
+_SCALE_MATCHER = KeywordMatcher([kw for _, kws in SCALE_KEYWORDS for kw in kws])
+_SCALE_OF_KEYWORD = [scale for scale, kws in SCALE_KEYWORDS for _ in kws]
+
+
+def infer_scale(topic_name: str) -> str:
+    """scale of a concept from its name: the first scale with a keyword hit"""
+    hit = _SCALE_MATCHER.first(topic_name)
+    if hit is None:
+        return 'DESCRIPTIVE'
+    return _SCALE_OF_KEYWORD[hit]
+
+
+def _strongly_connected_components(nodes, successors) -> list:
+    """iterative Tarjan's algorithm; returns components as lists of nodes"""
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    components = []
+    counter = 0
+
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(successors.get(root, ())))]
+
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in index:
+                    index[child] = low[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(successors.get(child, ()))))
+                    break
+                if child in on_stack:
+                    low[node] = min(low[node], index[child])
+            else:
+                # all children done: propagate low-link, pop a finished component
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+
+    return components
+
+
+def _reconstruct_paths(nodes) -> list:
+    """rebuild [target, ..., node] ids for every closure node from parent pointers"""
+    parent_of = {node: parent for node, _depth, parent in nodes}
+    paths = []
+    for node, _depth, _parent in nodes:
+        path = [node]
+        while parent_of[path[-1]] is not None:
+            path.append(parent_of[path[-1]])
+        path.reverse()
+        paths.append(path)
+    return paths
+
+
+def _closure_size(nodes, edges) -> int:
+    """approximate bytes held by a closure (names are shared with self.nodes)"""
+    size = sys.getsizeof(nodes) + sys.getsizeof(edges)
+    size += sum(sys.getsizeof(n) for n in nodes)
+    size += sum(sys.getsizeof(e) for e in edges)
+    return size
+
 
 class PathTracer:
-    def __init__(self, graph_path: str):
-        """load knowledge graph"""
-        with open(graph_path) as f:
-            self.graph = json.load(f)
+    def __init__(self, graph_path: str, warm_budget_mb: float = 0, warm_depth: int = 5):
+        """
+        load knowledge graph.
+
+        warm_budget_mb > 0 opts in to precomputing prerequisite closures
+        (see warm_closures) so traces become lookups instead of BFS.
+        """
+        # a binary snapshot (graph_snapshot.py) maps in directly; JSON is compiled
+        # to the same interned form in memory
+        if is_snapshot(graph_path):
+            snap = load_snapshot(graph_path)
+            if snap.scales != SCALE_ORDER:
+                raise ValueError(f"{graph_path}: snapshot scales {snap.scales} differ from "
+                                 f"{SCALE_ORDER}; rebuild it")
+        else:
+            with open(graph_path) as f:
+                snap = compile_graph(json.load(f), infer_scale, SCALE_ORDER,
+                                     source=Path(graph_path).name)
+
+        # concept names are interned to integer ids; names only cross the API boundary
+        self.names = snap.names                 # id -> name (nodes first, then edge-only names)
+        self.index = {name: i for i, name in enumerate(self.names)}  # name -> id
+
+        # scale is a pure function of the name, classified once when compiling
+        # (a 'scale' persisted on the node by the build step wins)
+        self.scale_codes = snap.scale_codes
+        # pagerank per interned id (0 for names only seen on edges)
+        self.pageranks = snap.pageranks
 
         # build lookup structures
+        counts = snap.counts.tolist()
+        pageranks = snap.pageranks.tolist()
+        type_codes = snap.type_codes.tolist()
+        scale_codes = snap.scale_codes.tolist()
         self.nodes = {}
-        for n in self.graph['nodes']:
-            self.nodes[n['id']] = {
-                'label': n.get('label', n['id']),
-                'type': n.get('type', 'concept'),
-                'count': n.get('count', 0),
-                'scale': n.get('group', 'DESCRIPTIVE'),  # group often = scale
-                'pagerank': n.get('pagerank', 0)
+        for i in range(snap.node_count):
+            self.nodes[self.names[i]] = {
+                'label': snap.labels[i],
+                'type': snap.types[type_codes[i]],
+                'count': counts[i],
+                'scale': SCALE_ORDER[scale_codes[i]],
+                'pagerank': pageranks[i]
             }
 
-        # build adjacency (reverse for tracing back)
-        self.prereqs = defaultdict(list)  # concept -> its prerequisites
-        self.enables = defaultdict(list)   # concept -> what it enables
+        # concept -> its prerequisites (reverse adjacency, for tracing back)
+        self.prereq_offsets, self.prereq_indices, self.prereq_weights = snap.csr('prerequisite_for', 'in')
+        # concept -> what it enables
+        self.enables_offsets, self.enables_indices, self.enables_weights = snap.csr('prerequisite_for', 'out')
+
+        # question keywords whose concept exists in this graph
+        question_terms = [(t, c) for t, c in QUESTION_CONCEPTS.items() if c in self.nodes]
+        self._question_matcher = KeywordMatcher([t for t, _ in question_terms])
+        self._question_concepts = [c for _, c in question_terms]
+
+        # trigram index over node ids for fuzzy lookup; popular topics get a small prior
+        max_count = max((c['count'] for c in self.nodes.values()), default=0)
+        self._concept_index = TrigramIndex(
+            list(self.nodes),
+            priors=[float(np.log1p(c['count']) / np.log1p(max_count)) if max_count else 0.0
+                    for c in self.nodes.values()]
+        )
+
+        # topic listing index: ids pre-sorted per ordering, plus lowercased
+        # names in sorted order for prefix ranges (see list_concepts)
+        topics = np.array([i for i, c in enumerate(self.nodes.values()) if c['type'] == 'topic'],
+                          dtype=np.int32)
+        topic_counts = np.asarray(snap.counts)[topics]
+        self._topics_by = {
+            'count': topics[np.argsort(-topic_counts, kind='stable')],
+            'pagerank': topics[np.argsort(-self.pageranks[topics], kind='stable')],
+        }
+        self._topic_counts = np.zeros(len(self.names), dtype=np.int64)
+        self._topic_counts[topics] = topic_counts
+        by_name = sorted((self.names[i].lower(), i) for i in topics.tolist())
+        self._topic_names = [name for name, _ in by_name]
+        self._topic_name_ids = np.array([i for _, i in by_name], dtype=np.int32)
+
+        self.snapshot = snap
+        self.edge_count = snap.edge_count
+        print(f"Loaded graph: {len(self.nodes)} nodes, {self.edge_count} edges")
+
+        # per-thread visit stamps so traversals don't allocate a visited set
+        self._marks = threading.local()
+
+        # precomputed closures: target -> (depth cap, nodes, edges)
+        self.closures = {}
+        self.warm_report = None
+        if warm_budget_mb > 0:
+            self.warm_closures(warm_budget_mb, warm_depth)
+
+    def warm_closures(self, budget_mb: float, max_depth: int = 5) -> dict:
+        """
+        precompute depth-layered prerequisite closures for topics,
+        most frequently mentioned first, until the memory budget is used.
+
+        a closure traced to max_depth also answers any shallower trace
+        (BFS visits depth <= d in the same order either way), so one
+        entry per topic is enough.
+        """
+        start = time.perf_counter()
+        budget = int(budget_mb * 1024 * 1024)
+        used = 0
+
+        topics = [cid for cid, cdata in self.nodes.items() if cdata['type'] == 'topic']
+        topics.sort(key=lambda cid: -self.nodes[cid]['count'])
+
+        self.closures = {}
+        for target in topics:
+            nodes, edges = self._closure(target, max_depth)
+            size = _closure_size(nodes, edges)
+            if used + size > budget:
+                break
+            self.closures[target] = (max_depth, nodes, edges)
+            used += size
+
+        self.warm_report = {
+            'topics': len(topics),
+            'warmed': len(self.closures),
+            'depth': max_depth,
+            'bytes': used,
+            'budget_bytes': budget,
+            'seconds': round(time.perf_counter() - start, 3)
+        }
+        print(f"Warmed {len(self.closures)}/{len(topics)} topic closures "
+              f"in {self.warm_report['seconds']:.2f}s "
+              f"({used / 1024 / 1024:.1f} of {budget_mb:g} MB budget)")
+        return self.warm_report
+
+    def _visit_stamp(self):
+        """
+        (marks, stamp) for this thread: node i is visited in the current
+        traversal iff marks[i] == stamp, so nothing is cleared between traces.
+        """
+        local = self._marks
+        marks = getattr(local, 'marks', None)
+        if marks is None or len(marks) < len(self.names):
+            marks = local.marks = [0] * len(self.names)
+            local.stamp = 0
+        local.stamp += 1
+        return marks, local.stamp
+
+    def prereqs_of(self, concept: str) -> list:
+        """direct prerequisites of a concept, by name"""
+        i = self.index.get(concept)
+        if i is None:
+            return []
+        lo, hi = self.prereq_offsets[i], self.prereq_offsets[i + 1]
+        return [self.names[j] for j in self.prereq_indices[lo:hi]]
 
-        for e in self.graph['edges']:
-            if e.get('relation') == 'prerequisite_for':
-                target = e['target']
-                source = e['source']
-                self.prereqs[target].append(source)
-                self.enables[source].append(target)
+    def enables_of(self, concept: str) -> list:
+        """concepts that list this one as a prerequisite, by name"""
+        i = self.index.get(concept)
+        if i is None:
+            return []
+        lo, hi = self.enables_offsets[i], self.enables_offsets[i + 1]
+        return [self.names[j] for j in self.enables_indices[lo:hi]]
+
+    def search_concepts(self, query: str, k: int = 5, min_score: float = 0.0) -> list:
+        """
+        ranked fuzzy lookup of concept names.
+        returns up to k dicts with id, score (0-1) and node info, best first.
+        """
+        results = []
+        for i, score in self._concept_index.search(query, k, min_score):
+            cid = self.names[i]  # node ids come first, in graph order
+            cdata = self.nodes[cid]
+            results.append({
+                'id': cid,
+                'score': score,
+                'type': cdata['type'],
+                'count': cdata['count'],
+                'scale': cdata['scale']
+            })
+        return results
 
-        print(f"Loaded graph: {len(self.nodes)} nodes, {len(self.graph['edges'])} edges")
+    def list_concepts(self, offset: int = 0, limit: int = 100, scale: str = None,
+                      min_count: int = 10, prefix: str = None, sort: str = 'count') -> dict:
+        """
+        one page of topics, most mentioned (or highest pagerank) first.
+        filters: scale, min_count, and a case-insensitive name prefix.
+        served from the orderings built at load, so no per-call sort.
+        """
+        if sort not in CONCEPT_SORTS:
+            raise ValueError(f"sort must be one of {', '.join(CONCEPT_SORTS)}")
+        ids = self._topics_by[sort]
 
-    def find_concept(self, query: str) -> list:
-        """fuzzy match query to concept names"""
-        query_lower = query.lower()
-        matches = []
+        if sort == 'count':
+            # counts are descending here, so min_count keeps a prefix
+            kept = np.searchsorted(-self._topic_counts[ids], -min_count, side='right')
+            ids = ids[:kept]
+        else:
+            ids = ids[self._topic_counts[ids] >= min_count]
+        if scale is not None:
+            ids = ids[self.scale_codes[ids] == SCALE_DEPTH[scale]]
+        if prefix:
+            prefix = prefix.lower()
+            lo = bisect.bisect_left(self._topic_names, prefix)
+            hi = bisect.bisect_left(self._topic_names, prefix + '\U0010ffff', lo)
+            ids = ids[np.isin(ids, self._topic_name_ids[lo:hi])]
 
-        for cid, cdata in self.nodes.items():
-            cid_lower = cid.lower()
-            if query_lower in cid_lower or cid_lower in query_lower:
-                matches.append((cid, cdata, len(cid)))  # shorter = better match
+        page = ids[offset:offset + limit].tolist()
+        return {
+            'total': len(ids),
+            'offset': offset,
+            'limit': limit,
+            'concepts': [
+                {
+                    'id': self.names[i],
+                    'count': int(self._topic_counts[i]),
+                    'scale': SCALE_ORDER[self.scale_codes[i]],
+                    'pagerank': float(self.pageranks[i])
+                }
+                for i in page
+            ]
+        }
 
-        # sort by length (prefer exact/short matches)
-        matches.sort(key=lambda x: x[2])
-        return [(m[0], m[1]) for m in matches[:5]]
+    def find_concept(self, query: str, k: int = 5, min_score: float = FIND_MIN_SCORE) -> list:
+        """fuzzy match query to concept names, as (id, node info) best first"""
+        return [(m['id'], self.nodes[m['id']]) for m in self.search_concepts(query, k, min_score)]
 
-    def trace_prerequisites(self, target: str, max_depth: int = 5) -> dict:
+    def trace_prerequisites(self, target: str, max_depth: int = 5, include_paths: bool = False,
+                            budget: int = None, policy: str = 'pagerank') -> dict:
         """
         trace all prerequisite paths back from target.
         returns tree structure with depth and scale info.
+
+        include_paths=True also fills 'paths' with the BFS path
+        [target, ..., node] to every traced node.
+
+        budget caps the number of nodes: the frontier is then expanded
+        best-first by policy (see TRACE_POLICIES) instead of breadth-first,
+        so the highest-scoring prerequisites are kept.
         """
+        return self._trace(target, max_depth, include_paths, budget, policy, 'prereqs')
+
+    def trace_enables(self, target: str, max_depth: int = 5, include_paths: bool = False,
+                      budget: int = None, policy: str = 'pagerank') -> dict:
+        """
+        forward trace: everything mastering target unlocks, in the same
+        layered format as trace_prerequisites (edges still point from
+        prerequisite to dependent). result['direction'] is 'enables'.
+        """
+        return self._trace(target, max_depth, include_paths, budget, policy, 'enables')
+
+    def _trace(self, target: str, max_depth: int, include_paths: bool, budget: int,
+               policy: str, direction: str) -> dict:
         if target not in self.nodes:
             return {"error": f"Concept '{target}' not found"}
 
-        visited = set()
+        nodes, edges = self._lookup_closure(target, max_depth, budget, policy, direction)
+        result = self._build_trace(target, nodes, edges, include_paths)
+        if direction != 'prereqs':
+            result['direction'] = direction
+        if budget is not None:
+            result['budget'] = {'nodes': budget, 'policy': policy, 'reached': len(nodes) >= budget}
+        return result
+
+    def neighborhood(self, target: str, back_depth: int = 2, forward_depth: int = 2,
+                     include_paths: bool = False) -> dict:
+        """
+        prerequisites up to back_depth and what target enables up to
+        forward_depth, found in one traversal (a concept reachable both
+        ways appears once, on the nearer side).
+
+        layered like trace_prerequisites, but node and edge depths are
+        signed: negative behind target (prerequisites), positive ahead.
+        """
+        if target not in self.nodes:
+            return {"error": f"Concept '{target}' not found"}
+
+        back = (memoryview(self.prereq_offsets), memoryview(self.prereq_indices))
+        ahead = (memoryview(self.enables_offsets), memoryview(self.enables_indices))
+        marks, stamp = self._visit_stamp()
+        nodes = []
+        edges = []
+
+        # frontier entries: (node, side, parent); side -1 behind, +1 ahead, 0 the target
+        frontier = [(self.index[target], 0, None)]
+        level = 0
+        while frontier:
+            next_frontier = []
+            for current, side, parent in frontier:
+                if marks[current] == stamp:
+                    continue
+                marks[current] = stamp
+                nodes.append((current, side * level, parent))
+
+                if side <= 0 and level < back_depth:
+                    offsets, indices = back
+                    for prereq in indices[offsets[current]:offsets[current + 1]]:
+                        if marks[prereq] != stamp and prereq != current:
+                            edges.append((prereq, current, -(level + 1)))
+                            next_frontier.append((prereq, -1, current))
+                if side >= 0 and level < forward_depth:
+                    offsets, indices = ahead
+                    for enabled in indices[offsets[current]:offsets[current + 1]]:
+                        if marks[enabled] != stamp and enabled != current:
+                            edges.append((current, enabled, level + 1))
+                            next_frontier.append((enabled, 1, current))
+            frontier = next_frontier
+            level += 1
+
+        result = self._build_trace(target, tuple(nodes), tuple(edges), include_paths)
+        result['direction'] = 'both'
+        result['neighborhood'] = {
+            'back_depth': back_depth,
+            'forward_depth': forward_depth,
+            'prerequisites': sum(1 for n in nodes if n[1] < 0),
+            'enables': sum(1 for n in nodes if n[1] > 0)
+        }
+        return result
+
+    def iter_trace_json(self, target: str, max_depth: int = 5, include_paths: bool = False,
+                        budget: int = None, policy: str = 'pagerank', direction: str = 'prereqs'):
+        """
+        the trace_prerequisites payload as JSON text fragments, for streaming.
+        layers and funnel come first, then nodes and paths, and edges last.
+        only the closure's (node, depth, parent) ids and the layer names
+        are held; node entries, paths and edges are built and encoded one
+        per fragment (edges are regenerated from the adjacency, never
+        collected). parses to the same object as trace_prerequisites
+        (or trace_enables, with direction='enables').
+        """
+        if target not in self.nodes:
+            yield json.dumps({"error": f"Concept '{target}' not found"})
+            return
+
+        nodes, _ = self._lookup_closure(target, max_depth, budget, policy, direction, with_edges=False)
+        layers, funnel = self._layers(nodes)
+        names = self.names
+        codes = memoryview(self.scale_codes)
+        dumps = json.dumps
+
+        yield '{"target": ' + dumps(target)
+        yield ', "target_info": ' + dumps(self.nodes[target])
+        yield ', "layers": ' + dumps(layers)
+        yield ', "funnel": ' + dumps(funnel)
+        del layers, funnel
+        if direction != 'prereqs':
+            yield ', "direction": ' + dumps(direction)
+        if budget is not None:
+            yield ', "budget": ' + dumps({'nodes': budget, 'policy': policy, 'reached': len(nodes) >= budget})
+
+        yield ', "all_nodes": {'
+        for k, (current, depth, _parent) in enumerate(nodes):
+            name = names[current]
+            yield (', ' if k else '') + dumps(name) + ': ' + dumps(self._node_entry(name, codes[current], depth, target))
+        yield '}, "paths": ['
+        if include_paths:
+            parent_of = {node: parent for node, _depth, parent in nodes}
+            for k, (current, _depth, _parent) in enumerate(nodes):
+                path = [current]
+                while parent_of[path[-1]] is not None:
+                    path.append(parent_of[path[-1]])
+                yield (', ' if k else '') + dumps([names[i] for i in reversed(path)])
+
+        yield '], "all_edges": ['
+        edges = self._iter_closure_edges(nodes, max_depth, direction, budgeted=budget is not None)
+        for k, (source, dest, depth) in enumerate(edges):
+            yield (', ' if k else '') + dumps({'source': names[source], 'target': names[dest], 'depth': depth})
+        yield ']}'
+
+    def _lookup_closure(self, target: str, max_depth: int, budget: int = None, policy: str = 'pagerank',
+                        direction: str = 'prereqs', with_edges: bool = True):
+        """
+        precomputed closure cut to max_depth if warm, else a fresh BFS
+        (best-first under a budget). only prerequisite closures are warmed.
+        with_edges=False returns (nodes, None); see _iter_closure_edges.
+        """
+        if budget is not None:
+            return self._budgeted_closure(target, max_depth, budget, policy, direction, with_edges)
+        if direction != 'prereqs':
+            return self._closure(target, max_depth, direction, with_edges)
+        cached = self.closures.get(target)
+        if cached is not None and max_depth <= cached[0]:
+            nodes = [n for n in cached[1] if n[1] <= max_depth]
+            edges = [e for e in cached[2] if e[2] <= max_depth + 1] if with_edges else None
+            return nodes, edges
+        return self._closure(target, max_depth, with_edges=with_edges)
+
+    def _iter_closure_edges(self, nodes, max_depth: int, direction: str = 'prereqs', budgeted: bool = False):
+        """
+        the edges of a closure, regenerated one at a time from its nodes in
+        the order _closure (or _budgeted_closure) lists them. while a node
+        is expanded, exactly the nodes before it in visit order are marked,
+        so an edge is kept iff its far end comes later (or, unbudgeted, is
+        never visited; budgeted closures keep taken nodes only and don't
+        expand at max_depth).
+        """
+        offsets, indices, _ = map(memoryview, self._adjacency(direction))
+        forward = direction == 'enables'
+        position = {node: i for i, (node, _depth, _parent) in enumerate(nodes)}
+        unvisited = len(nodes)
+
+        for i, (current, depth, _parent) in enumerate(nodes):
+            if budgeted and depth == max_depth:
+                continue
+            for prereq in indices[offsets[current]:offsets[current + 1]]:
+                later = position.get(prereq, -1 if budgeted else unvisited)
+                if later > i and prereq != current:
+                    yield (current, prereq, depth + 1) if forward else (prereq, current, depth + 1)
+
+    def _adjacency(self, direction: str):
+        """(offsets, indices, weights) CSR arrays for a trace direction"""
+        if direction == 'prereqs':
+            return self.prereq_offsets, self.prereq_indices, self.prereq_weights
+        if direction == 'enables':
+            return self.enables_offsets, self.enables_indices, self.enables_weights
+        raise ValueError(f"direction must be one of {', '.join(TRACE_DIRECTIONS)}")
+
+    def _closure(self, target: str, max_depth: int, direction: str = 'prereqs', with_edges: bool = True):
+        """
+        level-synchronous BFS from target over the integer CSR adjacency,
+        back through prerequisites or forward through what it enables.
+        returns (nodes, edges) in visit order as integer-id tuples of
+        (node, depth, parent) and (source, target, depth); edges always
+        point from prerequisite to dependent.
+
+        only parent pointers are kept; paths are rebuilt on request.
+        """
+        # memoryviews iterate as plain ints without copying the arrays
+        offsets, indices, _ = map(memoryview, self._adjacency(direction))
+        forward = direction == 'enables'
+        marks, stamp = self._visit_stamp()
+        nodes = []
+        edges = []
+
+        # BFS to find all prerequisites, one depth layer at a time
+        start = self.index[target]
+        parents = {start: None}  # first discoverer wins, same as a FIFO queue
+        frontier = [start]
+        depth = 0
+
+        while frontier and depth <= max_depth:
+            next_frontier = []
+            for current in frontier:
+                if marks[current] == stamp:
+                    continue
+                marks[current] = stamp
+                nodes.append((current, depth, parents[current]))
+
+                # get prerequisites (or dependents, going forward)
+                for prereq in indices[offsets[current]:offsets[current + 1]]:
+                    if marks[prereq] != stamp and prereq != current:  # avoid self-loops
+                        if with_edges:
+                            edges.append((current, prereq, depth + 1) if forward else (prereq, current, depth + 1))
+                        next_frontier.append(prereq)
+                        parents.setdefault(prereq, current)
+            frontier = next_frontier
+            depth += 1
+
+        return tuple(nodes), tuple(edges) if with_edges else None
+
+    def _budgeted_closure(self, target: str, max_depth: int, budget: int, policy: str = 'pagerank',
+                          direction: str = 'prereqs', with_edges: bool = True):
+        """
+        best-first variant of _closure: a max-heap of candidate prerequisites
+        keyed by policy score, stopping once budget nodes are taken.
+        returns the same (nodes, edges) tuples, restricted to taken nodes.
+        """
+        score_of = TRACE_POLICIES.get(policy)
+        if score_of is None:
+            raise ValueError(f"policy must be one of {', '.join(TRACE_POLICIES)}")
+        if budget < 1:
+            raise ValueError("budget must be at least 1")
+
+        offsets, indices, weights = map(memoryview, self._adjacency(direction))
+        forward = direction == 'enables'
+        pageranks = memoryview(self.pageranks)
+        smoothing = 1.0 / len(self.names)
+        marks, stamp = self._visit_stamp()
+        nodes = []
+        edges = []
+
+        # (-score, tie-break, node, depth, parent); ties go to the earlier push
+        heap = [(-1.0, 0, self.index[target], 0, None)]
+        pushed = 1
+        while heap and len(nodes) < budget:
+            _score, _seq, current, depth, parent = heapq.heappop(heap)
+            if marks[current] == stamp:
+                continue
+            marks[current] = stamp
+            nodes.append((current, depth, parent))
+            if depth == max_depth:
+                continue
+
+            decay = TRACE_DEPTH_DECAY ** (depth + 1)
+            for k in range(offsets[current], offsets[current + 1]):
+                prereq = indices[k]
+                if marks[prereq] != stamp and prereq != current:  # avoid self-loops
+                    if with_edges:
+                        edges.append((current, prereq, depth + 1) if forward else (prereq, current, depth + 1))
+                    score = score_of(pageranks[prereq] + smoothing, weights[k], decay)
+                    heapq.heappush(heap, (-score, pushed, prereq, depth + 1, current))
+                    pushed += 1
+
+        if not with_edges:
+            return tuple(nodes), None
+        # keep only edges within the taken set
+        edges = [e for e in edges if marks[e[0]] == stamp and marks[e[1]] == stamp]
+        return tuple(nodes), tuple(edges)
+
+    def _node_entry(self, name: str, code: int, depth: int, target: str) -> dict:
+        """one all_nodes value"""
+        node_info = self.nodes.get(name, {'count': 0})
+        return {
+            'id': name,
+            'scale': SCALE_ORDER[code],
+            'depth': depth,
+            'count': node_info.get('count', 0),
+            'pagerank': node_info.get('pagerank', 0),
+            'is_target': name == target
+        }
+
+    def _layers(self, nodes):
+        """(layers, funnel) for a closure: names per scale, visit order kept"""
+        names = self.names
+        codes = memoryview(self.scale_codes)
+
+        # counting sort of visited nodes into scale buckets
+        buckets = [[] for _ in SCALE_ORDER]
+        for current, _depth, _parent in nodes:
+            buckets[codes[current]].append(names[current])
+
+        # layers and funnel structure (ordered by scale)
+        layers = {}
+        funnel = []
+        for code, bucket in enumerate(buckets):
+            if bucket:
+                scale = SCALE_ORDER[code]
+                layers[scale] = bucket
+                funnel.append({
+                    'scale': scale,
+                    'depth': code,
+                    'nodes': bucket,
+                    'count': len(bucket)
+                })
+        return layers, funnel
+
+    def _build_trace(self, target: str, nodes, edges, include_paths: bool = False) -> dict:
+        """assemble the visualization payload from a closure (names resolved here)"""
+        names = self.names
+        codes = memoryview(self.scale_codes)
+        layers, funnel = self._layers(nodes)
         result = {
             'target': target,
             'target_info': self.nodes[target],
             'paths': [],
             'all_nodes': {},
             'all_edges': [],
-            'layers': defaultdict(list)  # scale -> nodes at that scale
+            'layers': layers  # scale -> nodes at that scale
         }
 
-        # BFS to find all prerequisites
-        queue = deque([(target, 0, [target])])  # (node, depth, path)
+        for current, depth, _parent in nodes:
+            name = names[current]
+            result['all_nodes'][name] = self._node_entry(name, codes[current], depth, target)
 
-        while queue:
-            current, depth, path = queue.popleft()
+        result['all_edges'] = [
+            {'source': names[source], 'target': names[dest], 'depth': depth}
+            for source, dest, depth in edges
+        ]
 
-            if current in visited or depth > max_depth:
-                continue
-            visited.add(current)
-
-            # add to results
-            node_info = self.nodes.get(current, {'scale': 'UNKNOWN', 'count': 0})
-            # infer scale from topic name since graph doesn't have it
-            scale = self._infer_scale(current)
-
-            result['all_nodes'][current] = {
-                'id': current,
-                'scale': scale,
-                'depth': depth,
-                'count': node_info.get('count', 0),
-                'pagerank': node_info.get('pagerank', 0),
-                'is_target': current == target
-            }
-            result['layers'][scale].append(current)
-
-            # get prerequisites
-            prereqs = self.prereqs.get(current, [])
-
-            for prereq in prereqs:
-                if prereq not in visited and prereq != current:  # avoid self-loops
-                    result['all_edges'].append({
-                        'source': prereq,
-                        'target': current,
-                        'depth': depth + 1
-                    })
-                    queue.append((prereq, depth + 1, path + [prereq]))
-
-        # convert layers to list format
-        result['layers'] = dict(result['layers'])
-
-        # compute funnel structure (layers ordered by scale)
-        result['funnel'] = []
-        for scale in SCALE_ORDER:
-            if scale in result['layers']:
-                result['funnel'].append({
-                    'scale': scale,
-                    'depth': SCALE_DEPTH[scale],
-                    'nodes': result['layers'][scale],
-                    'count': len(result['layers'][scale])
-                })
+        if include_paths:
+            result['paths'] = [[names[i] for i in path] for path in _reconstruct_paths(nodes)]
 
+        result['funnel'] = funnel
         return result
 
     def _normalize_scale(self, scale: str) -> str:
@@ -142,168 +738,311 @@ class PathTracer:
         return 'DESCRIPTIVE'  # default
 
     def _infer_scale(self, topic_name: str) -> str:
-        """infer scale from topic name keywords"""
-        name_lower = topic_name.lower()
-
-        # QUANTUM indicators
-        quantum_keywords = ['quantum', 'wave function', 'orbital', 'schrodinger', 'atomic structure',
-                           'electron configuration', 'quantum number', 'spin', 'pauli']
-        if any(kw in name_lower for kw in quantum_keywords):
-            return 'QUANTUM'
-
-        # ELECTRONIC indicators
-        electronic_keywords = ['crystal field', 'molecular orbital', 'mo theory', 'bonding',
-                              'electronic', 'd-orbital', 'splitting', 'cfse', 'ligand field',
-                              'band', 'magnetism', 'magnetic', 'spectroscopy', 'color']
-        if any(kw in name_lower for kw in electronic_keywords):
-            return 'ELECTRONIC'
-
-        # STRUCTURAL indicators
-        structural_keywords = ['symmetry', 'point group', 'geometry', 'structure', 'crystal',
-                              'coordination', 'isomer', 'lattice', 'unit cell', 'packing']
-        if any(kw in name_lower for kw in structural_keywords):
-            return 'STRUCTURAL'
-
-        # APPLICATION indicators
-        application_keywords = ['application', 'industrial', 'biological', 'catalysis', 'material',
-                               'environmental', 'medicine', 'synthesis', 'reaction mechanism']
-        if any(kw in name_lower for kw in application_keywords):
-            return 'APPLICATION'
-
-        # Default to DESCRIPTIVE
-        return 'DESCRIPTIVE'
+        """
+        infer scale from topic name keywords.
+        runs once per node at load; traces read self.scale_codes.
+        """
+        return infer_scale(topic_name)
 
-    def generate_learning_path(self, target: str, known: list = None) -> dict:
+    def generate_learning_path(self, target: str, known: list = None, max_depth: int = 5) -> dict:
         """
         generate optimal learning path to target, skipping known concepts.
         returns ordered list of concepts to learn.
-        """
-        known = set(known or [])
-        trace = self.trace_prerequisites(target)
-
-        if 'error' in trace:
-            return trace
 
-        # topological sort of prerequisites
-        all_nodes = set(trace['all_nodes'].keys())
-        to_learn = all_nodes - known - {target}
-
-        # build dependency order
-        in_degree = defaultdict(int)
-        for edge in trace['all_edges']:
-            if edge['target'] in to_learn:
-                in_degree[edge['target']] += 1
-
-        # nodes with no prerequisites (or all prereqs known)
-        queue = deque([n for n in to_learn if in_degree[n] == 0])
-        order = []
-
-        while queue:
-            current = queue.popleft()
-            order.append(current)
+        prerequisite cycles among the concepts are collapsed and reported
+        under 'cycles'; their members are taught together.
+        """
+        if target not in self.nodes:
+            return {"error": f"Concept '{target}' not found"}
 
-            for edge in trace['all_edges']:
-                if edge['source'] == current and edge['target'] in to_learn:
-                    in_degree[edge['target']] -= 1
-                    if in_degree[edge['target']] == 0:
-                        queue.append(edge['target'])
+        known = set(known or [])
+        known_ids = {self.index[k] for k in known if k in self.index}
+        target_id = self.index[target]
 
-        # add remaining (might have cycles)
-        remaining = to_learn - set(order)
-        order.extend(remaining)
+        nodes, _edges = self._lookup_closure(target, max_depth)
+        to_learn = {node for node, _depth, _parent in nodes} - known_ids - {target_id}
 
+        order, cycles = self._learning_order(to_learn)
         # add target at end
-        order.append(target)
+        order.append(target_id)
 
         # build path with metadata
         path = []
-        for i, concept in enumerate(order):
-            node_info = trace['all_nodes'].get(concept, {})
+        for i, node in enumerate(order):
+            concept = self.names[node]
             path.append({
                 'step': i + 1,
                 'concept': concept,
-                'scale': node_info.get('scale', 'UNKNOWN'),
+                'scale': SCALE_ORDER[self.scale_codes[node]],
                 'status': 'known' if concept in known else ('target' if concept == target else 'to_learn'),
-                'pagerank': node_info.get('pagerank', 0)
+                'pagerank': float(self.pageranks[node])
             })
 
         return {
             'target': target,
             'total_steps': len(path),
             'new_concepts': len(to_learn),
-            'path': path
+            'path': path,
+            'cycles': [[self.names[n] for n in cycle] for cycle in cycles]
         }
 
-    def question_to_path(self, question: str) -> dict:
+    def generate_plan(self, targets: list, known: list = None, max_depth: int = 5) -> dict:
         """
-        take a natural language question, find relevant concept,
-        trace path, return visualization data.
+        one ordered learning plan covering several targets (e.g. a unit's topics).
+        shorthand for a single-student plan_for_roster.
         """
-        # extract key terms (simple approach)
-        key_terms = [
-            'color', 'blue', 'green', 'red',  # → Color/d-d transitions
-            'magnetic', 'paramagnet', 'diamagnet',  # → Magnetism
-            'crystal field', 'splitting', 'CFT',  # → Crystal Field Theory
-            'orbital', 'MO', 'bonding',  # → MO Theory
-            'structure', 'geometry', 'shape',  # → Coordination/Structure
-            'acid', 'base', 'pH',  # → Acid-Base
-            'redox', 'oxidation', 'reduction',  # → Redox
-            'solid', 'crystal', 'lattice',  # → Solid State
-            'symmetry', 'point group',  # → Symmetry
-            'periodic', 'trend',  # → Periodic Trends
-        ]
+        roster = self.plan_for_roster(targets, {'student': known or []}, max_depth)
+        if 'error' in roster:
+            return roster
 
-        question_lower = question.lower()
+        plan = roster['students']['student']
+        path = []
+        for i, concept in enumerate(plan['path']):
+            info = roster['concepts'][concept]
+            path.append({
+                'step': i + 1,
+                'concept': concept,
+                'scale': info['scale'],
+                'status': 'target' if concept in roster['targets'] else 'to_learn',
+                'pagerank': info['pagerank']
+            })
 
-        # map to concepts
-        concept_map = {
-            'color': 'Color And Magnetism Of Coordination Compounds',
-            'blue': 'Crystal Field Theory',
-            'magnetic': 'Magnetic Properties Of Transition Metals',
-            'crystal field': 'Crystal Field Theory',
-            'splitting': 'Crystal Field Theory',
-            'orbital': 'Molecular Orbital Theory',
-            'symmetry': 'Molecular Symmetry And Group Theory',
-            'point group': 'Symmetry And Point Groups',
-            'solid': 'Solid State Chemistry',
-            'lattice': 'Crystal Structures',
-            'acid': 'Acid-Base Chemistry',
-            'redox': 'Redox Chemistry',
-            'periodic': 'Periodic Trends',
+        return {
+            'targets': roster['targets'],
+            'total_steps': len(path),
+            'new_concepts': plan['new_concepts'],
+            'path': path,
+            'cycles': plan['cycles']
+        }
+
+    def plan_for_roster(self, targets: list, students: dict, max_depth: int = 5) -> dict:
+        """
+        learning plans for many students sharing the same targets.
+
+        the merged prerequisite DAG of all targets and its topological
+        order are computed once. each student then only needs a walk back
+        from the targets that stops at concepts they already know (so
+        prerequisites of known concepts are skipped), and their plan is
+        the shared order filtered to what that walk reached.
+
+        students maps a name to that student's known concepts.
+        """
+        missing = [t for t in targets if t not in self.nodes]
+        if missing:
+            return {"error": f"Concepts not found: {missing}"}
+
+        target_ids = list(dict.fromkeys(self.index[t] for t in targets))
+
+        # merged DAG: union of the targets' closures, ordered once
+        # (targets always belong, even when max_depth leaves a closure empty)
+        members = set(target_ids)
+        for target in target_ids:
+            nodes, _edges = self._lookup_closure(self.names[target], max_depth)
+            members.update(node for node, _depth, _parent in nodes)
+        order, cycles = self._learning_order(members)
+        position = {node: i for i, node in enumerate(order)}
+
+        # prerequisite lists restricted to the merged DAG, for the per-student walks
+        offsets, indices = memoryview(self.prereq_offsets), memoryview(self.prereq_indices)
+        prereqs_within = {
+            node: [p for p in indices[offsets[node]:offsets[node + 1]] if p in members and p != node]
+            for node in members
+        }
+
+        plans = {}
+        for student, known in students.items():
+            known_ids = {self.index[k] for k in known or [] if k in self.index}
+            needed = set()
+            stack = [t for t in target_ids if t not in known_ids]
+            while stack:
+                node = stack.pop()
+                if node in needed:
+                    continue
+                needed.add(node)
+                stack.extend(p for p in prereqs_within[node] if p not in known_ids and p not in needed)
+
+            path = sorted(needed, key=position.__getitem__)
+            plans[student] = {
+                'total_steps': len(path),
+                'new_concepts': len(needed.difference(target_ids)),
+                'path': [self.names[n] for n in path],
+                'cycles': [[self.names[n] for n in c] for c in cycles if needed.issuperset(c)]
+            }
+
+        return {
+            'targets': [self.names[t] for t in target_ids],
+            'merged_concepts': len(members),
+            'cycles': [[self.names[n] for n in c] for c in cycles],
+            # per-concept metadata once, instead of repeating it in every plan
+            'concepts': {
+                self.names[n]: {
+                    'scale': SCALE_ORDER[self.scale_codes[n]],
+                    'pagerank': float(self.pageranks[n])
+                }
+                for n in order
+            },
+            'students': plans
         }
 
-        # find best match
-        for term, concept in concept_map.items():
-            if term in question_lower:
-                if concept in self.nodes:
-                    return self.trace_prerequisites(concept)
+    def _learning_order(self, members: set):
+        """
+        topological order of concept ids so every prerequisite comes first.
+
+        uses the prerequisite edges among members, collapses strongly
+        connected components, then runs Kahn's algorithm over the
+        condensation with a heap: among ready concepts, higher PageRank
+        (more fundamental) first, then name. O((V + E) log V).
+        returns (ordered ids, cycles as lists of ids).
+        """
+        offsets, indices = memoryview(self.prereq_offsets), memoryview(self.prereq_indices)
+        names, pageranks = self.names, self.pageranks
+
+        # successor lists: prereq -> concepts that need it
+        successors = defaultdict(list)
+        for node in members:
+            for prereq in indices[offsets[node]:offsets[node + 1]]:
+                if prereq != node and prereq in members:
+                    successors[prereq].append(node)
+
+        def rank(node):
+            return (-pageranks[node], names[node])
+
+        components = [sorted(c, key=rank) for c in _strongly_connected_components(members, successors)]
+        component_of = {}
+        for ci, component in enumerate(components):
+            for node in component:
+                component_of[node] = ci
+
+        # condensation DAG
+        in_degree = [0] * len(components)
+        component_succ = [set() for _ in components]
+        for prereq, dependents in successors.items():
+            a = component_of[prereq]
+            for node in dependents:
+                b = component_of[node]
+                if a != b and b not in component_succ[a]:
+                    component_succ[a].add(b)
+                    in_degree[b] += 1
 
-        # fallback: fuzzy search
-        words = question_lower.split()
-        for word in words:
+        # components are keyed by their best-ranked member
+        heap = [(rank(c[0]), ci) for ci, c in enumerate(components) if in_degree[ci] == 0]
+        heapq.heapify(heap)
+        order = []
+        while heap:
+            _key, ci = heapq.heappop(heap)
+            order.extend(components[ci])
+            for cj in component_succ[ci]:
+                in_degree[cj] -= 1
+                if in_degree[cj] == 0:
+                    heapq.heappush(heap, (rank(components[cj][0]), cj))
+
+        cycles = [c for c in components if len(c) > 1]
+        return order, cycles
+
+    def resolve_question(self, question: str):
+        """
+        map a natural language question to the concept it should trace.
+        returns the concept id, or None if nothing matches.
+        """
+        question_lower = question.lower()
+
+        # find best match: every keyword hit in one pass, earliest-listed wins
+        hit = self._question_matcher.first(question_lower)
+        if hit is not None:
+            return self._question_concepts[hit]
+
+        # fallback: fuzzy search, best-scoring match over all words
+        best = None
+        for word in question_lower.split():
             if len(word) > 4:  # skip short words
-                matches = self.find_concept(word)
-                if matches:
-                    return self.trace_prerequisites(matches[0][0])
+                matches = self.search_concepts(word, 1, FIND_MIN_SCORE)
+                if matches and (best is None or matches[0]['score'] > best['score']):
+                    best = matches[0]
+        if best is not None:
+            return best['id']
+
+        return None
+
+    def question_to_path(self, question: str, max_depth: int = 5) -> dict:
+        """
+        take a natural language question, find relevant concept,
+        trace path, return visualization data.
+        """
+        concept = self.resolve_question(question)
+        if concept is None:
+            return {"error": "Could not map question to concept", "question": question}
+        return self.trace_prerequisites(concept, max_depth)
+
+
+def benchmark(tracer: PathTracer, max_depth: int = 5, repeat: int = 5) -> dict:
+    """
+    time the prerequisite BFS for every topic and measure its allocations
+    (tracemalloc peak per trace and total allocated across one pass).
+    """
+    import tracemalloc
+
+    topics = [cid for cid, cdata in tracer.nodes.items() if cdata['type'] == 'topic']
+    # hubs: the 20 topics with the largest closures, where path copying hurt most
+    hubs = sorted(topics, key=lambda cid: -len(tracer._closure(cid, max_depth)[0]))[:20]
+
+    def run(targets):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for target in targets:
+                tracer._closure(target, max_depth)
+        elapsed = time.perf_counter() - start
 
-        return {"error": "Could not map question to concept", "question": question}
+        peak = 0
+        total = 0
+        tracemalloc.start()
+        for target in targets:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            closure = tracer._closure(target, max_depth)
+            traced_peak = tracemalloc.get_traced_memory()[1]
+            peak = max(peak, traced_peak - before)
+            total += traced_peak - before
+            del closure
+        tracemalloc.stop()
+
+        return {
+            'traces': len(targets) * repeat,
+            'seconds': round(elapsed, 4),
+            'us_per_trace': round(elapsed / (len(targets) * repeat) * 1e6, 1),
+            'peak_bytes_max': peak,
+            'peak_bytes_total': total
+        }
+
+    return {'max_depth': max_depth, 'all_topics': run(topics), 'hubs': run(hubs)}
 
 
 def main():
     import argparse
     parser = argparse.ArgumentParser(description="Trace prerequisite paths")
     parser.add_argument("--graph", default="/storage/inorganic-chem-class/experiments/results/chemkg_enhanced.json",
-                        help="Path to knowledge graph JSON")
+                        help="Path to knowledge graph JSON or binary snapshot (graph_snapshot.py)")
     parser.add_argument("--question", "-q", help="Natural language question")
     parser.add_argument("--concept", "-c", help="Direct concept name")
     parser.add_argument("--output", "-o", help="Output JSON file")
     parser.add_argument("--depth", type=int, default=5, help="Max trace depth")
+    parser.add_argument("--enables", action="store_true",
+                        help="With --concept, trace forward to what the concept unlocks")
+    parser.add_argument("--warm-mb", type=float, default=0,
+                        help="Precompute topic closures within this memory budget (MB)")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Time the prerequisite BFS over every topic and report allocations")
     args = parser.parse_args()
 
-    tracer = PathTracer(args.graph)
+    tracer = PathTracer(args.graph, warm_budget_mb=args.warm_mb, warm_depth=max(args.depth, 5))
+
+    if args.benchmark:
+        print(json.dumps(benchmark(tracer, args.depth), indent=2))
+        return
 
     if args.question:
-        result = tracer.question_to_path(args.question)
+        result = tracer.question_to_path(args.question, args.depth)
+    elif args.concept and args.enables:
+        result = tracer.trace_enables(args.concept, args.depth)
     elif args.concept:
         result = tracer.trace_prerequisites(args.concept, args.depth)
     else:
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Trigram Index: ranked fuzzy lookup over concept labels
+
+an inverted index from character trigrams to the labels containing
+them. a query only touches the postings of its own trigrams, so lookup
+cost follows the query (and how common its trigrams are), not the
+number of labels.
+
+scores combine trigram overlap (Dice coefficient), whole-string
+containment in either direction, and an optional per-label prior.
+"""
+
+from collections import defaultdict
+
+import numpy as np
+
+# score weights: trigram overlap, substring containment, prior
+W_OVERLAP = 0.7
+W_CONTAINS = 0.2
+W_PRIOR = 0.1
+
+
+def trigrams(text: str) -> set:
+    """character trigrams of a lowercased, space-padded string"""
+    padded = f"  {text.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """
+    inverted trigram index over a fixed list of labels.
+    results refer to labels by their position in that list.
+    """
+
+    def __init__(self, labels: list, priors: list = None):
+        self.labels = [label.lower() for label in labels]
+        self.priors = np.asarray(priors if priors is not None else [0.0] * len(labels), dtype=np.float64)
+        sizes = []
+
+        postings = defaultdict(list)
+        for doc, label in enumerate(self.labels):
+            grams = trigrams(label)
+            sizes.append(len(grams))
+            for g in grams:
+                postings[g].append(doc)
+        self._sizes = np.asarray(sizes, dtype=np.int32)
+        self._postings = {g: np.asarray(docs, dtype=np.int32) for g, docs in postings.items()}
+
+    def search(self, query: str, k: int = 5, min_score: float = 0.0) -> list:
+        """top-k (label position, score) pairs, best first"""
+        query_lower = query.lower().strip()
+        grams = trigrams(query_lower)
+        if not query_lower or not grams or k <= 0:
+            return []
+
+        # count shared trigrams per candidate label (only postings of the query's grams)
+        hit_lists = [self._postings[g] for g in grams if g in self._postings]
+        if not hit_lists:
+            return []
+        docs, overlap = np.unique(np.concatenate(hit_lists), return_counts=True)
+
+        dice = 2 * overlap / (len(grams) + self._sizes[docs])
+        base = W_OVERLAP * dice + W_PRIOR * self.priors[docs]
+
+        # containment can add at most W_CONTAINS, so only candidates within
+        # that margin of the current k-th best base score need the string test
+        if len(base) > k:
+            cutoff = np.partition(base, -k)[-k] - W_CONTAINS
+            keep = np.nonzero(base >= cutoff)[0]
+            docs, base = docs[keep], base[keep]
+
+        scored = []
+        for doc, score in zip(docs.tolist(), base.tolist()):
+            label = self.labels[doc]
+            if query_lower in label or label in query_lower:
+                score += W_CONTAINS
+            if score >= min_score:
+                scored.append((score, doc))
+
+        # best score first; shorter label, then index order, breaks ties
+        scored.sort(key=lambda x: (-x[0], len(self.labels[x[1]]), x[1]))
+        return [(doc, round(score, 4)) for score, doc in scored[:k]]